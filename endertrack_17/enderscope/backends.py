@@ -0,0 +1,522 @@
+"""
+Firmware backends of the Stage.
+
+The Stage speaks G-code, but how positions are read, how the motion queue is
+fed and how a move is cut short depends on the firmware:
+
+- Marlin acknowledges each line with ok, reports positions on M114 and syncs
+  with M400. Its M115 report lists optional capabilities (Cap: lines);
+- GRBL answers the one byte real-time query ``?`` with a status report at any
+  time and is streamed by counting the characters in its 128 byte receive
+  buffer;
+- Klipper is driven through Moonraker's JSON-RPC API, which pushes toolhead
+  positions to subscribers and runs multi-line scripts in one call.
+
+select_backend() picks the backend from the firmware's answer to the
+connection probe, the Stage then delegates to it::
+
+    stage = Stage('/dev/ttyUSB0')
+    stage.backend.name, stage.backend.capabilities
+"""
+import collections
+import itertools
+import json
+import re
+import socket
+import threading
+import time
+
+from responses import Ok, Position
+from supervisor import update_modal
+
+GRBL_STATUS = re.compile(r'<([A-Za-z]+)[^|>]*\|(MPos|WPos):([-0-9.]+),([-0-9.]+),([-0-9.]+)')
+GRBL_WCO = re.compile(r'WCO:([-0-9.]+),([-0-9.]+),([-0-9.]+)')
+
+
+class Backend:
+    """
+    Firmware specific operations of a Stage
+    """
+
+    name = 'generic'
+    capabilities = frozenset()
+    # jog segments are relative moves needing G91 and setting F, both restored afterwards
+    jog_modal = True
+    # mm/min the firmware moves at before any F word, Marlin and Klipper start at 25 mm/s
+    default_feedrate = 1500
+    # stream() window when the caller gives none
+    stream_window = 4
+    home_code = 'G28'
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    @classmethod
+    def detect(cls, stage):
+        """
+        :return: True if the firmware behind stage is handled by this backend
+        """
+        return False
+
+    def supports(self, capability):
+        return capability in self.capabilities
+
+    def position(self):
+        """
+        :return: {'X': x, 'Y': y, 'Z': z}, None if the firmware gave no position
+        """
+        raise NotImplementedError
+
+    def wait_idle(self):
+        """
+        Returns once the queued moves are done
+        """
+        raise NotImplementedError
+
+    def stream(self, lines, window=4, numbered=True, reset_line_numbers=True, progress=None):
+        raise NotImplementedError
+
+    def jog_command(self, words, speed):
+        return f"G1 F{speed:g} {words}"
+
+    def quick_stop(self):
+        """
+        Drops the queued moves without losing the position
+        :return: the number of oks the firmware will send for it
+        """
+        return 0
+
+    def emergency_stop(self, reset=True):
+        raise NotImplementedError
+
+
+class MarlinBackend(Backend):
+    """
+    Marlin and firmwares answering M115 with FIRMWARE_NAME (RepRapFirmware, Prusa...)
+    """
+
+    name = 'marlin'
+
+    def __init__(self, stage):
+        super().__init__(stage)
+        capabilities = {'ok_window', 'line_numbers', 'm114'}
+        for line in stage.firmware_info:
+            # Cap:EMERGENCY_PARSER:1
+            if line.startswith('Cap:'):
+                _, cap, value = (line.split(':') + ['0'])[:3]
+                if value.strip() == '1':
+                    capabilities.add(cap.lower())
+        self.capabilities = frozenset(capabilities)
+
+    @classmethod
+    def detect(cls, stage):
+        return any('FIRMWARE_NAME:' in line for line in stage.firmware_info)
+
+    def position(self):
+        stage = self.stage
+        position = None
+        with stage.lock:
+            stage.flush_serial_buffer()
+            stage.write_raw('M114')
+            while True:
+                reply = stage.read_reply()
+                if reply is None:
+                    return None
+                if isinstance(reply, Position):
+                    position = reply
+                elif isinstance(reply, Ok):
+                    break
+        if position is None:
+            return None
+        return {'X': position.x, 'Y': position.y, 'Z': position.z, 'E': position.e or 0.0}
+
+    def wait_idle(self):
+        self.stage.write_code('M400')
+
+    def stream(self, lines, window=4, numbered=True, reset_line_numbers=True, progress=None):
+        stage = self.stage
+        with stage.lock:
+            if numbered and reset_line_numbers:
+                stage.write_code("M110 N0")
+            source = iter(lines)
+            in_flight = collections.deque()
+            sent = acked = skip_oks = 0
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < window:
+                    try:
+                        code = next(source).strip()
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if not code:
+                        continue
+                    sent += 1
+                    data = stage.numbered_line(sent, code) if numbered else code
+                    stage.write_raw(data)
+                    in_flight.append((sent, data, code, time.perf_counter()))
+                if not in_flight:
+                    break
+                response = stage.read_line()
+                if not response:
+                    raise TimeoutError(f"no ok for line {in_flight[0][0]} within {stage.serial.timeout} s")
+                if response.startswith("ok"):
+                    if skip_oks:
+                        skip_oks -= 1
+                        continue
+                    n, data, code, written = in_flight.popleft()
+                    acked += 1
+                    update_modal(stage.modal, code)
+                    if stage.run_log:
+                        stage.run_log.ack(code, time.perf_counter() - written)
+                    if progress:
+                        progress(sent, acked)
+                elif response.startswith(("Resend:", "rs ")):
+                    # the ok following a resend request does not ack a line
+                    skip_oks += 1
+                    first = int(response.replace(':', ' ').split()[-1])
+                    for n, data, code, written in in_flight:
+                        if n >= first:
+                            stage.write_raw(data)
+                elif response.startswith(("Error", "!!")):
+                    if "checksum" in response.lower() or "line number" in response.lower():
+                        continue
+                    raise RuntimeError(f"line {in_flight[0][0]}: {response.strip()}")
+        return acked
+
+    def quick_stop(self):
+        self.stage.serial.write(b"M410\n")
+        return 1
+
+    def emergency_stop(self, reset=True):
+        self.stage.serial.write(b"M112\n")
+        if reset:
+            # M999 is only parsed once M112 has been handled
+            time.sleep(0.1)
+            self.stage.serial.write(b"M999\n")
+
+
+class GrblBackend(Backend):
+    """
+    GRBL 1.1: real-time status reports and character-counting streaming
+    """
+
+    name = 'grbl'
+    capabilities = frozenset({'status_report', 'char_counting', 'jog_cancel'})
+    jog_modal = False
+    home_code = '$H'
+    RX_BUFFER = 128
+
+    def __init__(self, stage):
+        super().__init__(stage)
+        self.state = None
+        self.offset = (0.0, 0.0, 0.0)
+
+    @classmethod
+    def detect(cls, stage):
+        if any(line.startswith('Grbl') for line in stage.firmware_info):
+            return True
+        try:
+            return any(line.startswith('[VER:') for line in stage.query('$I'))
+        except (RuntimeError, TimeoutError):
+            return False
+
+    def status(self):
+        """
+        Sends the real-time ? query, which GRBL answers even in the middle of
+        a move, without an ok
+        :return: (state, {'X': x, 'Y': y, 'Z': z}) in work coordinates
+        """
+        stage = self.stage
+        with stage.lock:
+            stage.flush_serial_buffer()
+            stage.serial.write(b"?")
+            while True:
+                response = stage.read_line()
+                if not response:
+                    raise TimeoutError(f"no status report within {stage.serial.timeout} s")
+                if response.startswith('<'):
+                    break
+        wco = GRBL_WCO.search(response)
+        if wco:
+            self.offset = tuple(float(v) for v in wco.groups())
+        match = GRBL_STATUS.match(response)
+        if not match:
+            return None, None
+        state, kind, *values = match.groups()
+        values = [float(v) for v in values]
+        if kind == 'MPos':
+            values = [v - o for v, o in zip(values, self.offset)]
+        self.state = state
+        return state, dict(zip('XYZ', values))
+
+    def position(self):
+        return self.status()[1]
+
+    def wait_idle(self):
+        # G4 P0 is only acknowledged once the planner has emptied
+        self.stage.write_code('G4 P0')
+
+    def stream(self, lines, window=None, numbered=False, reset_line_numbers=False, progress=None):
+        """
+        Keeps GRBL's receive buffer full: lines are sent as long as the bytes
+        not yet acknowledged fit in RX_BUFFER
+        """
+        stage = self.stage
+        with stage.lock:
+            in_flight = collections.deque()
+            used = sent = acked = 0
+            source = iter(lines)
+            exhausted = False
+            while True:
+                while not exhausted:
+                    try:
+                        code = next(source).strip()
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if not code:
+                        continue
+                    size = len(code) + 1
+                    while in_flight and used + size > self.RX_BUFFER:
+                        used -= self._ack(in_flight, acked)
+                        acked += 1
+                        if progress:
+                            progress(sent, acked)
+                    stage.write_raw(code)
+                    sent += 1
+                    used += size
+                    in_flight.append((size, code, time.perf_counter()))
+                if not in_flight:
+                    break
+                used -= self._ack(in_flight, acked)
+                acked += 1
+                if progress:
+                    progress(sent, acked)
+        return acked
+
+    def _ack(self, in_flight, acked):
+        """
+        Waits for the ok of the oldest line in flight and removes it
+        :return: its size in bytes
+        """
+        stage = self.stage
+        while True:
+            response = stage.read_line()
+            if not response:
+                raise TimeoutError(f"no ok for line {acked + 1} within {stage.serial.timeout} s")
+            if response.startswith('ok'):
+                size, code, written = in_flight.popleft()
+                update_modal(stage.modal, code)
+                if stage.run_log:
+                    stage.run_log.ack(code, time.perf_counter() - written)
+                return size
+            if response.startswith(('error:', 'ALARM:')):
+                raise RuntimeError(f"line {acked + 1}: {response.strip()}")
+
+    def jog_command(self, words, speed):
+        return f"$J=G91 {words} F{speed:g}"
+
+    def quick_stop(self):
+        # jog cancel: flushes the jog motions, the position is kept
+        self.stage.serial.write(b"\x85")
+        return 0
+
+    def emergency_stop(self, reset=True):
+        # feed hold stops with deceleration, the reset then clears the buffers
+        self.stage.serial.write(b"!")
+        if reset:
+            time.sleep(0.1)
+            self.stage.serial.write(b"\x18")
+
+
+BACKENDS = (MarlinBackend, GrblBackend)
+
+
+def select_backend(stage):
+    """
+    :return: the backend matching the firmware of stage, Marlin if none claims it
+    """
+    for backend in BACKENDS:
+        if backend.detect(stage):
+            return backend(stage)
+    return MarlinBackend(stage)
+
+
+class MoonrakerClient:
+    """
+    JSON-RPC 2.0 client for Moonraker's unix socket, each message ends with ETX
+    Replies are matched to calls by id, notifications go to on_notification.
+    """
+
+    ETX = b'\x03'
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.on_notification = None
+        self.on_close = None
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def call(self, method, params=None, timeout=None):
+        """
+        :return: the result of the call
+        :raises RuntimeError: on a JSON-RPC error
+        :raises TimeoutError: without a reply within timeout s
+        """
+        if self.closed:
+            raise ConnectionError(f"{self.path} is closed")
+        request_id = next(self._ids)
+        slot = {'event': threading.Event()}
+        self._pending[request_id] = slot
+        message = {'jsonrpc': '2.0', 'method': method, 'id': request_id}
+        if params is not None:
+            message['params'] = params
+        try:
+            with self._send_lock:
+                self.sock.sendall(json.dumps(message).encode('utf-8') + self.ETX)
+            if not slot['event'].wait(timeout or self.timeout):
+                raise TimeoutError(f"no reply to {method} within {timeout or self.timeout} s")
+        finally:
+            self._pending.pop(request_id, None)
+        if 'closed' in slot:
+            raise ConnectionError(f"{self.path} closed during {method}")
+        reply = slot['reply']
+        if 'error' in reply:
+            raise RuntimeError(f"{method}: {reply['error'].get('message')}")
+        return reply.get('result')
+
+    def _read(self):
+        buffer = b''
+        error = None
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError as e:
+                error = e
+                break
+            if not data:
+                break
+            buffer += data
+            while self.ETX in buffer:
+                raw, buffer = buffer.split(self.ETX, 1)
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                slot = self._pending.get(message.get('id'))
+                if slot is not None:
+                    slot['reply'] = message
+                    slot['event'].set()
+                elif 'method' in message and self.on_notification:
+                    self.on_notification(message['method'], message.get('params') or [])
+        self.closed = True
+        for slot in list(self._pending.values()):
+            slot['closed'] = True
+            slot['event'].set()
+        if self.on_close:
+            self.on_close(error or ConnectionError(f"{self.path} closed"))
+
+    def close(self):
+        self.on_close = None
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class KlipperBackend(Backend):
+    """
+    Klipper through Moonraker: positions are pushed by a subscription and
+    G-code is sent as multi-line scripts
+    """
+
+    name = 'klipper'
+    capabilities = frozenset({'subscriptions', 'batched_scripts'})
+    # lines per script: each script is a Moonraker round trip
+    stream_window = 50
+
+    def __init__(self, stage, client):
+        super().__init__(stage)
+        self.client = client
+        self.latest = None
+        self._responses = None
+        client.on_notification = self._notified
+        status = client.call('printer.objects.subscribe',
+                             {'objects': {'toolhead': ['position', 'homed_axes']}})
+        self._update(status.get('status', {}))
+
+    def _notified(self, method, params):
+        if method == 'notify_status_update' and params:
+            self._update(params[0])
+        elif method == 'notify_gcode_response' and params and self._responses is not None:
+            self._responses.append(params[0])
+
+    def _update(self, status):
+        toolhead = status.get('toolhead') or {}
+        if 'position' in toolhead:
+            self.latest = dict(zip('XYZ', (float(v) for v in toolhead['position'][:3])))
+            self.stage.position = self.latest
+
+    def script(self, script, timeout=None):
+        return self.client.call('printer.gcode.script', {'script': script}, timeout)
+
+    def query(self, script, timeout=None):
+        """
+        :return: the responses Klipper printed while running script
+        """
+        self._responses = []
+        try:
+            self.script(script, timeout)
+            return self._responses
+        finally:
+            self._responses = None
+
+    def position(self):
+        # kept current by notify_status_update, no round trip
+        return dict(self.latest) if self.latest else None
+
+    def wait_idle(self):
+        self.script('M400')
+
+    def stream(self, lines, window=50, numbered=False, reset_line_numbers=False, progress=None):
+        """
+        Sends the lines as scripts of window lines each, the window the caller passes
+        """
+        sent = 0
+        batch = []
+        for code in itertools.chain(lines, [None]):
+            if code is not None:
+                code = code.strip()
+                if not code:
+                    continue
+                batch.append(code)
+            if batch and (code is None or len(batch) >= window):
+                run_log = self.stage.run_log
+                written = time.perf_counter()
+                self.script('\n'.join(batch))
+                latency = time.perf_counter() - written
+                for line in batch:
+                    update_modal(self.stage.modal, line)
+                    if run_log:
+                        run_log.command(line)
+                        run_log.ack(line, latency)
+                sent += len(batch)
+                batch = []
+                if progress:
+                    progress(sent, sent)
+        return sent
+
+    def emergency_stop(self, reset=True):
+        self.client.call('printer.emergency_stop')
+        if reset:
+            self.client.call('printer.firmware_restart')
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Times input events through the input daemon and its websocket.
+
+    python benchmarks/bench_bridge.py [--quick] [--output FILE]
+
+The daemon runs in this process on ws://localhost:8765, as in production,
+with synthetic events emitted from a thread in place of a controller:
+
+- latency: events spaced 20 ms apart, from emit() to the websocket client;
+- burst: events queued at once, received per second by the client.
+
+Both are measured for a JSON client and for a client that negotiated the
+binary frames, which also reports how many frames the burst took.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import ROOT, summarize, rate, report  # noqa: E402
+
+sys.path.insert(0, ROOT)
+from inputs import InputDaemon, input_event, decode_frame  # noqa: E402
+
+PORT = 8765
+
+
+def port_free(port):
+    with socket.socket() as sock:
+        return sock.connect_ex(('127.0.0.1', port)) != 0
+
+
+def start_daemon():
+    """
+    Runs an InputDaemon without backends in a thread
+    """
+    daemon = InputDaemon(backends=[], port=PORT)
+    ready = threading.Event()
+
+    async def serve():
+        started = asyncio.Event()
+        task = asyncio.create_task(daemon.serve(started))
+        await started.wait()
+        ready.set()
+        await task
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    if not ready.wait(10):
+        raise RuntimeError("the daemon did not start")
+    return daemon
+
+
+def event(i):
+    return input_event('bench', 'cc', i % 128, i % 128)
+
+
+async def receive(websocket, binary):
+    """
+    :return: the events of the next input message
+    """
+    message = await websocket.recv()
+    if binary:
+        return decode_frame(message)
+    return [input_event(**json.loads(message)['data'])]
+
+
+async def measure(daemon, spaced, burst, binary=False):
+    import websockets
+    async with websockets.connect(f'ws://localhost:{PORT}') as websocket:
+        await websocket.recv()  # device list
+        if binary:
+            await websocket.send(json.dumps({'type': 'hello', 'formats': ['binary']}))
+            await websocket.recv()
+        latencies = []
+        for i in range(spaced):
+            daemon.emit(event(i))
+            received, = await receive(websocket, binary)
+            latencies.append(time.time() - received.timestamp)
+            await asyncio.sleep(0.02)
+
+        start = time.perf_counter()
+        for i in range(burst):
+            daemon.emit(event(i))
+        frames = received = 0
+        while received < burst:
+            received += len(await receive(websocket, binary))
+            frames += 1
+        elapsed = time.perf_counter() - start
+    return {'latency': summarize(latencies),
+            'burst': {'events': burst, 'frames': frames, 'events_per_s': rate(burst, elapsed)}}
+
+
+def run(quick=False):
+    if not port_free(PORT):
+        return {'skipped': f'port {PORT} in use, stop the running input daemon'}
+    daemon = start_daemon()
+    spaced, burst = (50, 100) if quick else (200, 500)
+    results = asyncio.run(measure(daemon, spaced, burst))
+    results['binary'] = asyncio.run(measure(daemon, spaced, burst, binary=True))
+    return results
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--quick', action='store_true')
+    arguments.add_argument('--output')
+    options = arguments.parse_args()
+    report('bridge', run(options.quick), options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Checks and times responses.py against the str parsing it replaces.
+
+    python benchmarks/bench_parser.py [--lines 200000] [--seed 1] [--quick] [--output FILE]
+
+- differential: random M114 reports parse to the same position as the
+  former Stage.get_position code;
+- fuzz: random bytes, split in random chunks, never raise and give the same
+  results as parsing the whole lines;
+- microbenchmark: lines per second of both parsers on a typical reply mix.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import report  # noqa: E402
+from responses import ResponseParser, parse_line, Position, Ok, Temperature, Resend  # noqa: E402
+
+
+def legacy_position(line):
+    """Stage.get_position before responses.py"""
+    position = line.split(" Count")[0]
+    parts = position.split()
+    return {part.split(":")[0]: float(part.split(":")[1]) for part in parts}
+
+
+def legacy_parse(raw):
+    """Decode then startswith, as write_code and get_position did"""
+    line = raw.decode('utf-8')
+    if line.startswith("ok"):
+        return 'ok'
+    if line.startswith("X:"):
+        return legacy_position(line)
+    return line.strip()
+
+
+def m114(rng):
+    x, y, z = (round(rng.uniform(-200, 200), 2) for _ in range(3))
+    return (f"X:{x:.2f} Y:{y:.2f} Z:{z:.2f} E:0.00 "
+            f"Count X:{round(x * 80)} Y:{round(y * 80)} Z:{round(z * 400)}").encode()
+
+
+def differential(rng, count):
+    for _ in range(count):
+        line = m114(rng)
+        expected = legacy_position(line.decode())
+        result = parse_line(line)
+        assert isinstance(result, Position), line
+        assert (result.x, result.y, result.z, result.e) == (
+            expected['X'], expected['Y'], expected['Z'], expected['E']), line
+    assert parse_line(b'ok') == Ok(None)
+    assert parse_line(b'ok N12') == Ok(12)
+    assert parse_line(b'Resend: 7') == Resend(7)
+    assert parse_line(b'rs N7') == Resend(7)
+    assert parse_line(b'ok T:20.5 /0.0 B:21.0 /60.0 @:0 B@:0') == Temperature(20.5, 0.0, 21.0, 60.0)
+    assert parse_line(b' T:210.0 /210.0 B:60.0 /60.0 @:127') == Temperature(210.0, 210.0, 60.0, 60.0)
+
+
+def fuzz(rng, count):
+    alphabet = b'okXYZET:BNRrs/ .-0123456789!echo:busyError\r\xff\x00'
+    for _ in range(count):
+        lines = []
+        for _ in range(rng.randint(1, 8)):
+            if rng.random() < 0.3:
+                lines.append(m114(rng))
+            else:
+                lines.append(bytes(rng.choice(alphabet) for _ in range(rng.randint(0, 40))))
+        stream = b'\n'.join(lines) + b'\n'
+        whole = []
+        for line in stream.split(b'\n')[:-1]:
+            line = line[:-1] if line.endswith(b'\r') else line
+            if line:
+                whole.append(parse_line(line))
+        parser = ResponseParser()
+        chunked = []
+        position = 0
+        while position < len(stream):
+            step = rng.randint(1, 16)
+            chunked += parser.feed(stream[position:position + step])
+            position += step
+        assert chunked == whole, stream
+        assert parser.pending() == 0
+
+
+def benchmark(rng, count):
+    mix = [m114(rng) if i % 2 else b'ok' for i in range(1000)]
+    mix += [b'echo:busy: processing', b'ok T:20.5 /0.0 B:21.0 /60.0 @:0 B@:0']
+    stream = b'\n'.join(mix) + b'\n'
+    repeats = max(1, count // len(mix))
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for line in stream.split(b'\n')[:-1]:
+            legacy_parse(line)
+    results['legacy'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parser = ResponseParser()
+    for _ in range(repeats):
+        parser.feed(stream)
+    results['responses'] = time.perf_counter() - start
+
+    lines = repeats * len(mix)
+    speeds = {f'{name}_lines_per_s': round(lines / elapsed) for name, elapsed in results.items()}
+    speeds['speedup'] = round(results['legacy'] / results['responses'], 3)
+    return speeds
+
+
+def run(quick=False, lines=200000, seed=1):
+    """
+    :raises AssertionError: if the differential or fuzz check fails
+    """
+    rng = random.Random(seed)
+    differential(rng, 1000 if quick else 10000)
+    fuzz(rng, 200 if quick else 2000)
+    return benchmark(rng, lines // 10 if quick else lines)
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--lines', type=int, default=200000)
+    arguments.add_argument('--seed', type=int, default=1)
+    arguments.add_argument('--quick', action='store_true')
+    arguments.add_argument('--output')
+    options = arguments.parse_args()
+    report('parser', run(options.quick, options.lines, options.seed), options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Times ScanPatterns path generation from 10^3 to 10^6 points.
+
+    python benchmarks/bench_patterns.py [--quick] [--output FILE]
+
+spiral grows its array one point at a time, quadratic in the number of
+points, so it stops at 10^4.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import report  # noqa: E402
+from patterns import ScanPatterns  # noqa: E402
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+LIMITS = {'spiral': 10 ** 4}
+
+
+def grid(points):
+    side = math.isqrt(points)
+    return side, points // side
+
+
+GENERATORS = {
+    'raster': lambda n: ScanPatterns.raster(*grid(n)),
+    'snake': lambda n: ScanPatterns.snake(*grid(n)),
+    'random': lambda n: ScanPatterns.random(n),
+    'spiral': lambda n: ScanPatterns.spiral(n),
+}
+
+
+def best_of(function, points, repeats):
+    best = math.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(points)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(quick=False):
+    sizes = SIZES[:3] if quick else SIZES
+    results = {}
+    for name, function in GENERATORS.items():
+        results[name] = {}
+        for points in sizes:
+            if points > LIMITS.get(name, points):
+                continue
+            elapsed = best_of(function, points, 1 if points >= 10 ** 5 else 3)
+            results[name][str(points)] = {'ms': round(1000 * elapsed, 3),
+                                          'points_per_s': round(points / elapsed)}
+    return results
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--quick', action='store_true')
+    arguments.add_argument('--output')
+    options = arguments.parse_args()
+    report('patterns', run(options.quick), options.output)
+
+
+if __name__ == '__main__':
+    main()
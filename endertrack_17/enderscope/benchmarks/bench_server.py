@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Times hardware-server.py requests under concurrent clients, on a Marlin stand-in.
+
+    python benchmarks/bench_server.py [--quick] [--output FILE]
+
+The server runs in this process on a free port with the threaded werkzeug
+server. Each client thread keeps one HTTP connection open and alternates
+GET /api/position and POST /api/move/relative, for 1, 4 and 16 clients.
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import HardwareServer, summarize, rate, report  # noqa: E402
+from simulator import VirtualMarlin  # noqa: E402
+
+CLIENTS = (1, 4, 16)
+ENDPOINTS = (('GET', '/api/position', None),
+             ('POST', '/api/move/relative', {'dx': 0.1, 'dy': 0.0, 'dz': 0.0}))
+
+
+def client(port, requests, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        for i in range(requests):
+            method, path, body = ENDPOINTS[i % len(ENDPOINTS)]
+            sent = time.perf_counter()
+            connection.request(method, path, body=json.dumps(body) if body else None,
+                               headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+            latencies[path].append(time.perf_counter() - sent)
+            if response.status != 200 or not payload.get('success'):
+                errors.append(path)
+    finally:
+        connection.close()
+
+
+def load(port, clients, requests):
+    latencies = {path: [] for _, path, _ in ENDPOINTS}
+    errors = []
+    threads = [threading.Thread(target=client, args=(port, requests, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    result = {'requests_per_s': rate(clients * requests, elapsed), 'errors': len(errors)}
+    result.update({path: summarize(samples) for path, samples in latencies.items()})
+    return result
+
+
+def run(quick=False):
+    requests = 50 if quick else 400
+    results = {}
+    with VirtualMarlin() as device, HardwareServer(device.port) as server:
+        for clients in CLIENTS[:2] if quick else CLIENTS:
+            results[f'{clients}_clients'] = load(server.port, clients, requests)
+    return results
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--quick', action='store_true')
+    arguments.add_argument('--output')
+    options = arguments.parse_args()
+    report('server', run(options.quick), options.output)
+
+
+if __name__ == '__main__':
+    main()
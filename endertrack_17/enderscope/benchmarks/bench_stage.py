@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Times the Stage driver against a Marlin or GRBL stand-in on a pseudo-terminal.
+
+    python benchmarks/bench_stage.py [--firmware marlin|grbl] [--quick] [--output FILE]
+
+- write_code: commands per second and ack latency, one command at a time;
+- stream: lines per second through the flow-control window;
+- get_position: M114 (or ? on GRBL) round trips per second, parsing included.
+
+The stand-in answers at once, so the figures are the cost of the driver and
+of the pty, not of a real board.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import summarize, rate, report  # noqa: E402
+from simulator import VirtualMarlin, VirtualGrbl  # noqa: E402
+from driver import Stage  # noqa: E402
+
+DEVICES = {'marlin': VirtualMarlin, 'grbl': VirtualGrbl}
+
+
+def run(quick=False, firmware='marlin'):
+    commands = 500 if quick else 5000
+    results = {}
+    with DEVICES[firmware]() as device:
+        stage = Stage(device.port, homing=False, ack_timeout=5.0)
+        try:
+            latencies = []
+            start = time.perf_counter()
+            for i in range(commands):
+                sent = time.perf_counter()
+                stage.write_code(f"G0 X{i % 100}")
+                latencies.append(time.perf_counter() - sent)
+            elapsed = time.perf_counter() - start
+            results['write_code'] = {'commands_per_s': rate(commands, elapsed), 'ack': summarize(latencies)}
+
+            start = time.perf_counter()
+            acked = stage.stream(f"G1 X{i % 100} Y{i % 50}" for i in range(commands))
+            results['stream'] = {'lines_per_s': rate(acked, time.perf_counter() - start)}
+
+            queries = commands // 5
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(queries):
+                sent = time.perf_counter()
+                stage.get_position(dict=True)
+                latencies.append(time.perf_counter() - sent)
+            elapsed = time.perf_counter() - start
+            results['get_position'] = {'queries_per_s': rate(queries, elapsed), 'latency': summarize(latencies)}
+        finally:
+            stage.close()
+    return results
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--firmware', choices=sorted(DEVICES), default='marlin')
+    arguments.add_argument('--quick', action='store_true')
+    arguments.add_argument('--output')
+    options = arguments.parse_args()
+    report('stage', {options.firmware: run(options.quick, options.firmware)}, options.output)
+
+
+if __name__ == '__main__':
+    main()
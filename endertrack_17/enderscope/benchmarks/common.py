@@ -0,0 +1,131 @@
+"""
+Helpers shared by the benchmarks: latency summaries, environment, JSON results.
+"""
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ENDERSCOPE = os.path.dirname(BENCHMARKS)
+ROOT = os.path.dirname(ENDERSCOPE)
+
+if ENDERSCOPE not in sys.path:
+    sys.path.insert(0, ENDERSCOPE)
+
+
+def load_script(path, name):
+    """
+    Imports a script whose file name is not a module name (hardware-server.py...)
+    """
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class HardwareServer:
+    """
+    hardware-server.py served in this process on a free port, connected to a stage
+    stand-in, away from the console socket and position segment of a server in use::
+
+        with VirtualMarlin() as device, HardwareServer(device.port) as server:
+            http.client.HTTPConnection('127.0.0.1', server.port)
+    """
+
+    def __init__(self, port):
+        """
+        :param str port: serial port of the stand-in the server connects to
+        """
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        os.environ['ENDERSCOPE_CONSOLE'] = os.path.join(tempfile.mkdtemp(), 'console.sock')
+        os.environ['ENDERSCOPE_POSITION_SEGMENT'] = f'enderscope-bench-{os.getpid()}'
+        os.environ.pop('ENDERSCOPE_RUN_LOG', None)
+        os.environ.pop('ENDERSCOPE_CAPTURE', None)
+        self.module = load_script(os.path.join(ENDERSCOPE, 'hardware-server.py'), 'hardware_server')
+        logging.getLogger('enderscope').setLevel(logging.WARNING)
+        self._http = make_server('127.0.0.1', 0, self.module.app, threaded=True)
+        self.port = self._http.server_port
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        connected = self.module.app.test_client().post('/api/connect', json={'port': port}).get_json()
+        if not connected.get('success'):
+            self.close()
+            raise RuntimeError(connected.get('error'))
+
+    @property
+    def stage(self):
+        return self.module.stage
+
+    def close(self):
+        self.module.app.test_client().post('/api/disconnect')
+        self._http.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(samples):
+    """
+    :param samples: durations in s
+    :return: dict of count and mean, p50, p95, p99, max in ms
+    """
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(1000 * sum(ordered) / len(ordered), 4),
+        'p50_ms': round(1000 * percentile(ordered, 0.50), 4),
+        'p95_ms': round(1000 * percentile(ordered, 0.95), 4),
+        'p99_ms': round(1000 * percentile(ordered, 0.99), 4),
+        'max_ms': round(1000 * ordered[-1], 4),
+    }
+
+
+def rate(count, elapsed):
+    return round(count / elapsed, 2) if elapsed > 0 else None
+
+
+def environment():
+    """
+    :return: what the results depend on besides the code: commit, Python, machine
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def report(name, results, output=None):
+    """
+    Prints the results of a benchmark as JSON, and writes them to output if given
+    """
+    document = {'environment': environment(), 'benchmarks': {name: results}}
+    text = json.dumps(document, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Load test of hardware-server.py with concurrent clients, checked against SLOs.
+
+    python benchmarks/loadtest.py [--mix tab:4:5,bridge:1:20,script:1:2] [--duration 20]
+                                  [--slo move.p95_ms=100 ...] [--baseline FILE] [--output FILE]
+                                  [--url http://127.0.0.1:5000]
+
+Each client of the mix is an asyncio task with its own keep-alive
+connection, sending at its rate (requests per second) whatever its kind does:
+
+- tab: a browser tab polling GET /api/position and GET /api/status;
+- bridge: an input bridge sending POST /api/move/relative steps;
+- script: a script sending POST /api/gcode (G4 P0).
+
+Latency is measured from the time a request was due, so a server falling
+behind shows in the figures instead of slowing the clients down. Without
+--url the server runs in this process on a Marlin stand-in, its stage lock
+is timed too: how long requests waited for the serial link (contention) and
+how much of the run it was held (utilization).
+
+Exit status: 0 all SLOs met, 1 an SLO is missed or a figure regressed
+past --tolerance against --baseline, 2 the load test could not run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import HardwareServer, environment, summarize  # noqa: E402
+from simulator import VirtualMarlin  # noqa: E402
+
+KINDS = {
+    'tab': [('position', 'GET', '/api/position', None), ('status', 'GET', '/api/status', None)],
+    'bridge': [('move', 'POST', '/api/move/relative', {'dx': 0.1}), ('move', 'POST', '/api/move/relative', {'dx': -0.1})],
+    'script': [('gcode', 'POST', '/api/gcode', {'command': 'G4 P0'})],
+}
+MIX = 'tab:4:5,bridge:1:20,script:1:2'
+# upper bounds, <endpoint or all>.<metric>
+SLOS = {'all.p99_ms': 250.0, 'all.error_rate': 0.01, 'position.p95_ms': 100.0, 'move.p95_ms': 100.0}
+# ms below which a latency regression is noise
+SLACK_MS = 2.0
+
+
+class Connection:
+    """
+    Minimal HTTP/1.1 keep-alive client on asyncio streams
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None):
+        """
+        :return: (status, parsed JSON body)
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b''
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n")
+        self._writer.write(head.encode() + data)
+        try:
+            status = int((await self._reader.readline()).split()[1])
+            length, close = 0, False
+            while True:
+                line = (await self._reader.readline()).strip()
+                if not line:
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'connection' and value.strip().lower() == 'close':
+                    close = True
+            payload = await self._reader.readexactly(length)
+        except (IndexError, ValueError, asyncio.IncompleteReadError):
+            self.close()
+            raise ConnectionError(f"{method} {path}: connection closed by the server")
+        if close:
+            self.close()
+        return status, json.loads(payload) if payload else None
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class TimedLock:
+    """
+    Stands in for the stage lock and times how long it is waited for and held
+    """
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._owner = threading.local()
+        self.waits = []
+        self.held = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            now = time.perf_counter()
+            depth = getattr(self._owner, 'depth', 0)
+            if not depth:
+                self.waits.append(now - start)
+                self._owner.since = now
+            self._owner.depth = depth + 1
+        return acquired
+
+    def release(self):
+        self._owner.depth -= 1
+        if not self._owner.depth:
+            self.held += time.perf_counter() - self._owner.since
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def parse_mix(text):
+    """
+    :param str text: kind:clients:rate,...
+    :return: list of (kind, rate) per client
+    """
+    clients = []
+    for part in text.split(','):
+        kind, count, rate = part.split(':')
+        if kind not in KINDS:
+            raise ValueError(f"unknown client kind {kind!r}, expected one of {sorted(KINDS)}")
+        clients += [(kind, float(rate))] * int(count)
+    return clients
+
+
+def parse_slos(items):
+    slos = dict(SLOS)
+    for item in items or []:
+        name, _, value = item.partition('=')
+        slos[name] = float(value)
+    return slos
+
+
+async def client(host, port, kind, rate, deadline, samples):
+    connection = Connection(host, port)
+    interval = 1.0 / rate
+    due = time.perf_counter()
+    i = 0
+    try:
+        while due < deadline:
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            name, method, path, body = KINDS[kind][i % len(KINDS[kind])]
+            try:
+                status, payload = await connection.request(method, path, body)
+                ok = status == 200 and bool(payload and payload.get('success', True))
+            except (OSError, ValueError):
+                connection.close()
+                ok = False
+            samples.append((name, time.perf_counter() - due, ok))
+            i += 1
+            due += interval
+    finally:
+        connection.close()
+
+
+def scrape(base):
+    """
+    :return: {metric name: sum over its labels} of the serial and HTTP metrics
+    """
+    totals = {}
+    with urllib.request.urlopen(base + '/api/metrics', timeout=10) as response:
+        for line in response.read().decode().splitlines():
+            if line.startswith('#') or not line.startswith('enderscope_'):
+                continue
+            name, _, value = line.rpartition(' ')
+            name = name.split('{')[0]
+            totals[name] = totals.get(name, 0.0) + float(value)
+    return totals
+
+
+async def load(host, port, clients, duration):
+    samples = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(host, port, kind, rate, deadline, samples) for kind, rate in clients))
+    return samples
+
+
+def results_of(samples, elapsed):
+    by_endpoint = {'all': samples}
+    for sample in samples:
+        by_endpoint.setdefault(sample[0], []).append(sample)
+    endpoints = {}
+    for name, group in by_endpoint.items():
+        summary = summarize([latency for _, latency, _ in group])
+        summary['error_rate'] = round(sum(not ok for _, _, ok in group) / len(group), 4) if group else 0.0
+        summary['requests_per_s'] = round(len(group) / elapsed, 2)
+        endpoints[name] = summary
+    return endpoints
+
+
+def check(endpoints, slos, baseline=None, tolerance=0.2):
+    """
+    :return: list of failure messages, empty if everything holds
+    """
+    failures = []
+    for key, limit in slos.items():
+        name, _, metric = key.partition('.')
+        value = endpoints.get(name, {}).get(metric)
+        if value is not None and value > limit:
+            failures.append(f"SLO {key}: {value:g} > {limit:g}")
+    for name, before in (baseline or {}).items():
+        after = endpoints.get(name)
+        if not after:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if metric in before and metric in after:
+                if after[metric] > before[metric] * (1 + tolerance) + SLACK_MS:
+                    failures.append(f"regression {name}.{metric}: {after[metric]:g} ms, was {before[metric]:g} ms")
+        if after.get('error_rate', 0) > before.get('error_rate', 0) + 0.001:
+            failures.append(f"regression {name}.error_rate: {after['error_rate']:g}, was {before['error_rate']:g}")
+    return failures
+
+
+def run(clients, duration, url=None):
+    """
+    :return: results document
+    """
+    server = device = None
+    lock = None
+    try:
+        if url:
+            parsed = urllib.parse.urlsplit(url)
+            host, port, base = parsed.hostname, parsed.port or 80, url.rstrip('/')
+        else:
+            device = VirtualMarlin()
+            server = HardwareServer(device.port)
+            host, port = '127.0.0.1', server.port
+            base = f'http://{host}:{port}'
+            lock = server.stage.lock = TimedLock(server.stage.lock)
+        before = scrape(base)
+        start = time.perf_counter()
+        samples = asyncio.run(load(host, port, clients, duration))
+        elapsed = time.perf_counter() - start
+        after = scrape(base)
+    finally:
+        if server:
+            server.close()
+        if device:
+            device.close()
+
+    serial = {
+        'commands_per_s': round((after.get('enderscope_serial_commands_total', 0)
+                                 - before.get('enderscope_serial_commands_total', 0)) / elapsed, 2),
+        'ack_busy_fraction': round((after.get('enderscope_serial_ack_seconds_sum', 0)
+                                    - before.get('enderscope_serial_ack_seconds_sum', 0)) / elapsed, 4),
+    }
+    if lock:
+        serial['lock_wait'] = summarize(lock.waits)
+        serial['lock_held_fraction'] = round(lock.held / elapsed, 4)
+    return {'environment': environment(), 'duration_s': round(elapsed, 2), 'clients': len(clients),
+            'endpoints': results_of(samples, elapsed), 'serial': serial}
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--mix', default=MIX, help=f'kind:clients:rate,... (default {MIX})')
+    arguments.add_argument('--duration', type=float, default=20.0, help='s of load')
+    arguments.add_argument('--url', help='running server to load instead of an in-process one')
+    arguments.add_argument('--slo', action='append', metavar='ENDPOINT.METRIC=LIMIT',
+                           help=f'upper bound, repeatable, defaults {SLOS}')
+    arguments.add_argument('--baseline', help='earlier --output file the figures must not regress from')
+    arguments.add_argument('--tolerance', type=float, default=0.2, help='allowed latency regression, 0.2 = 20%%')
+    arguments.add_argument('--output', help='write the results as JSON')
+    options = arguments.parse_args()
+
+    try:
+        clients = parse_mix(options.mix)
+        slos = parse_slos(options.slo)
+        baseline = None
+        if options.baseline:
+            with open(options.baseline) as f:
+                baseline = json.load(f)['endpoints']
+        document = run(clients, options.duration, options.url)
+    except Exception as e:
+        print(f"💥 {e}", file=sys.stderr)
+        sys.exit(2)
+
+    failures = check(document['endpoints'], slos, baseline, options.tolerance)
+    document['slos'] = slos
+    document['failures'] = failures
+    text = json.dumps(document, indent=2)
+    print(text)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(text + '\n')
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    if not failures:
+        print("✅ SLOs tenus", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
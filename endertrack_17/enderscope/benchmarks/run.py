@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Runs the benchmark suite offline and writes one JSON document per commit.
+
+    python benchmarks/run.py [--quick] [--only stage,server] [--output FILE] [--compare FILE]
+
+Results go to benchmarks/results/<commit>.json unless --output is given.
+--compare prints each figure next to the one of an earlier result file:
+rates (per_s) are better higher, durations (ms) better lower.
+"""
+import argparse
+import json
+import os
+import sys
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import BENCHMARKS, environment  # noqa: E402
+import bench_parser  # noqa: E402
+import bench_stage  # noqa: E402
+import bench_patterns  # noqa: E402
+import bench_server  # noqa: E402
+import bench_bridge  # noqa: E402
+
+SUITE = {
+    'parser': bench_parser.run,
+    'stage': lambda quick: {firmware: bench_stage.run(quick, firmware) for firmware in bench_stage.DEVICES},
+    'patterns': bench_patterns.run,
+    'server': bench_server.run,
+    'bridge': bench_bridge.run,
+}
+
+
+def flatten(tree, prefix=''):
+    for key, value in tree.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(current, previous):
+    """
+    Prints the figures found in both documents with their ratio
+    """
+    before = dict(flatten(previous['benchmarks']))
+    print(f"\n{'':60s} {'before':>12s} {'after':>12s}")
+    for name, value in flatten(current['benchmarks']):
+        old = before.get(name)
+        if old is None or not (name.endswith('per_s') or name.endswith('_ms') or name.endswith('speedup')):
+            continue
+        change = ''
+        if old and value:
+            better = value / old if not name.endswith('_ms') else old / value
+            change = f"{better:6.2f}x {'better' if better > 1.05 else 'worse' if better < 0.95 else ''}"
+        print(f"{name:60s} {old:12g} {value:12g} {change}")
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arguments.add_argument('--quick', action='store_true', help='fewer iterations and sizes')
+    arguments.add_argument('--only', help=f"comma separated subset of {','.join(SUITE)}")
+    arguments.add_argument('--output', help='result file, default results/<commit>.json')
+    arguments.add_argument('--compare', help='earlier result file to compare with')
+    options = arguments.parse_args()
+
+    names = options.only.split(',') if options.only else list(SUITE)
+    unknown = set(names) - set(SUITE)
+    if unknown:
+        arguments.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    document = {'environment': environment(), 'quick': options.quick, 'benchmarks': {}}
+    failed = False
+    for name in names:
+        print(f"⏱️  {name}...", file=sys.stderr)
+        try:
+            document['benchmarks'][name] = SUITE[name](quick=options.quick)
+        except Exception as e:
+            traceback.print_exc()
+            document['benchmarks'][name] = {'error': str(e)}
+            failed = True
+
+    output = options.output
+    if not output:
+        os.makedirs(os.path.join(BENCHMARKS, 'results'), exist_ok=True)
+        output = os.path.join(BENCHMARKS, 'results', f"{document['environment']['commit'] or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+        f.write('\n')
+    print(f"📄 {output}", file=sys.stderr)
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare(document, json.load(f))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
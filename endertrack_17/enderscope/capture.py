@@ -0,0 +1,133 @@
+"""
+Capture of a serial session, both directions, for offline replay.
+
+CaptureSerial wraps an open serial port and appends every write and every
+non-empty read to a JSON lines file, stamped in s since the capture started::
+
+    stage = Stage('/dev/ttyUSB0', capture='scan-12.capture')
+    ...
+    stage.close()
+
+simulator.ReplayDevice then answers the same driver code with the recorded
+replies, at the recorded pace or faster, so driver changes can be timed
+against a production session without the printer.
+
+The file starts with a header object, then one [t, direction, data] array
+per event, direction being 'tx' (to the firmware) or 'rx', data the bytes
+decoded as latin-1 so any byte survives the round trip.
+"""
+import json
+import threading
+import time
+
+FORMAT = 'enderscope-capture'
+VERSION = 1
+TX, RX = 'tx', 'rx'
+
+
+class SerialTap:
+    """
+    serial.Serial stand-in passing the traffic of the port it wraps to tap()
+    Attributes it does not define (timeout, in_waiting, is_open...) are read
+    from and written to the wrapped port.
+    """
+
+    def __init__(self, ser):
+        self.__dict__['_ser'] = ser
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._ser, name, value)
+
+    def tap(self, direction, data):
+        """
+        Called with TX or RX and the non-empty bytes of every write and read
+        """
+
+    def write(self, data):
+        if data:
+            self.tap(TX, data)
+        return self._ser.write(data)
+
+    def read(self, size=1):
+        data = self._ser.read(size)
+        if data:
+            self.tap(RX, data)
+        return data
+
+    def readline(self, *args):
+        data = self._ser.readline(*args)
+        if data:
+            self.tap(RX, data)
+        return data
+
+    def read_until(self, *args, **kwargs):
+        data = self._ser.read_until(*args, **kwargs)
+        if data:
+            self.tap(RX, data)
+        return data
+
+    def close(self):
+        self._ser.close()
+
+
+class CaptureSerial(SerialTap):
+    """
+    Port wrapper appending its traffic to a capture file
+    """
+
+    def __init__(self, ser, filename):
+        """
+        :param ser: an open serial.Serial
+        :param str filename: capture file, overwritten
+        """
+        super().__init__(ser)
+        self.__dict__.update(filename=filename, _lock=threading.Lock(),
+                             _file=open(filename, 'w', encoding='utf-8'),
+                             _start=time.perf_counter())
+        header = {'format': FORMAT, 'version': VERSION, 'port': ser.port,
+                  'baud_rate': ser.baudrate, 'time': time.time()}
+        self._file.write(json.dumps(header) + '\n')
+
+    def tap(self, direction, data):
+        t = time.perf_counter() - self._start
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(json.dumps([round(t, 6), direction, bytes(data).decode('latin-1')]) + '\n')
+
+    def close(self):
+        """
+        Closes the port, the capture goes on if it is reopened
+        """
+        self._ser.close()
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def end(self):
+        """
+        Ends the capture, the port is left as it is
+        """
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(filename):
+    """
+    :return: (header dict, list of (t, direction, bytes))
+    :raises ValueError: if filename is not a capture of this version
+    """
+    with open(filename, encoding='utf-8') as f:
+        header = json.loads(f.readline() or 'null')
+        if not isinstance(header, dict) or header.get('format') != FORMAT or header.get('version') != VERSION:
+            raise ValueError(f"{filename} is not a version {VERSION} serial capture")
+        events = []
+        for line in f:
+            try:
+                t, direction, data = json.loads(line)
+            except ValueError:
+                break  # last line cut short by a crash
+            events.append((t, direction, data.encode('latin-1')))
+    return header, events
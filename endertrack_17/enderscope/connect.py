@@ -0,0 +1,103 @@
+"""
+Opening a serial link to a firmware and waiting until it answers.
+
+Opening a USB serial port normally pulses DTR, which resets most Arduino
+based boards and costs a couple of seconds of boot time. open_serial() keeps
+DTR low unless asked otherwise, and wait_ready() returns as soon as the board
+answers instead of sleeping a fixed delay: an already booted board is ready in
+one round trip, a booting one after its banner.
+"""
+import time
+
+import serial
+
+try:
+    import termios
+except ImportError:  # Windows
+    termios = None
+
+BOOT_BANNERS = ('start', 'Grbl', 'Klipper')
+# GRBL rejects the M115 probe with error:20, which proves it is listening too
+ACKS = ('ok', 'error:')
+
+
+def open_serial(port, baudrate, dtr_reset=False, timeout=None, **kwargs):
+    """
+    Opens a serial port
+    :param bool dtr_reset: let the port pulse DTR on open (and on close), resetting the board
+    :param timeout: read timeout in s, None blocks
+    :return: the open serial.Serial
+    """
+    ser = serial.Serial()
+    ser.port = port
+    ser.baudrate = baudrate
+    ser.timeout = timeout
+    for key, value in kwargs.items():
+        setattr(ser, key, value)
+    if not dtr_reset:
+        ser.dtr = False
+        ser.rts = False
+    ser.open()
+    if not dtr_reset and termios is not None:
+        # keep DTR low when the port is closed so the next open does not reset either
+        try:
+            attrs = termios.tcgetattr(ser.fd)
+            attrs[2] &= ~termios.HUPCL
+            termios.tcsetattr(ser.fd, termios.TCSANOW, attrs)
+        except (termios.error, AttributeError):
+            pass
+    return ser
+
+
+def wait_ready(ser, deadline=10.0, probe='M115', probe_interval=0.25):
+    """
+    Waits until the firmware acknowledges or rejects a command
+    The probe is sent straight away and again every probe_interval s until an
+    ok comes back, a boot banner restarts probing immediately.
+    :param ser: an open serial.Serial
+    :param float deadline: give up after this many s
+    :param str probe: command answered with an ok, M115 also reports the firmware
+    :return: the lines received before the first ok or error: (banner, M115 report)
+    :raises TimeoutError: if nothing acknowledged before the deadline
+    """
+    previous_timeout = ser.timeout
+    ser.timeout = min(probe_interval, 0.05)
+    start = time.monotonic()
+    lines = []
+    sent = 0
+    next_probe = start
+    try:
+        while True:
+            now = time.monotonic()
+            if now - start > deadline:
+                raise TimeoutError(f"{ser.port} did not answer within {deadline} s")
+            if now >= next_probe:
+                ser.write(f"{probe}\n".encode('utf-8'))
+                sent += 1
+                next_probe = now + probe_interval
+            line = ser.readline().decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+            if line.startswith(ACKS):
+                break
+            if line.startswith(BOOT_BANNERS):
+                next_probe = time.monotonic()
+            lines.append(line)
+        _drain_acks(ser, sent - 1, probe_interval)
+    finally:
+        ser.timeout = previous_timeout
+    return lines
+
+
+def _drain_acks(ser, count, wait):
+    """
+    Swallows the oks of the extra probes so they are not taken for replies,
+    probes lost while the board was booting just end the wait early
+    """
+    ser.timeout = wait
+    while count > 0:
+        line = ser.readline().decode('utf-8', errors='replace')
+        if not line:
+            break
+        if line.startswith(ACKS):
+            count -= 1
@@ -373,6 +373,11 @@ class EnderscopeConnection {
       
       const status = await response.json();
       
+      // Liaison série en cours de reconnexion côté serveur : on reste connecté
+      if (this.handleLinkStatus(status.link)) {
+        return;
+      }
+      
       // Vérifier si la connexion série est toujours active
       if (status.connected === false && this.isConnected) {
         this.handleConnectionLost('Port série déconnecté');
@@ -385,6 +390,27 @@ class EnderscopeConnection {
     }
   }
 
+  handleLinkStatus(link) {
+    if (!link) return false;
+    const notify = window.EnderTrack?.UI?.showNotification;
+    
+    if (link.state === 'reconnecting') {
+      if (!this.linkReconnecting) {
+        this.linkReconnecting = true;
+        notify?.('⚠️ Liaison série perdue - reconnexion en cours...', 'warning');
+      }
+      return true;
+    }
+    
+    if (this.linkReconnecting || (this.linkReconnects ?? link.reconnects) !== link.reconnects) {
+      this.linkReconnecting = false;
+      notify?.('✅ Liaison série rétablie', 'success');
+      this.syncPosition();
+    }
+    this.linkReconnects = link.reconnects;
+    return false;
+  }
+
   handleConnectionLost(reason) {
     console.log(`🔌 Connexion perdue: ${reason}`);
     this.isConnected = false;
@@ -0,0 +1,278 @@
+"""
+Serial console attached to the stage connection of the hardware server.
+
+The server owns the port; ConsoleServer taps its traffic and serves it on a
+local socket to any number of consoles (``terminal-serie.py --server``).
+Every console sees every line exchanged with the firmware, whoever sent it,
+and a throughput and ack latency line every second while commands flow. A
+line typed in a console is sent through the stage, under its lock, like any
+other command::
+
+    >> G0 X10
+    << ok
+    ## 12.0 cmd/s, ack 1.4 ms moy., 3.9 ms max
+
+The serial path only queues what it reads and writes: formatting and socket
+writes happen on the console thread, which sleeps on its queue. The port is
+only tapped while a console is connected.
+
+The default socket lives in a directory of the user's own, mode 0700
+($XDG_RUNTIME_DIR/enderscope, or enderscope-<uid> in the temporary
+directory), and is itself mode 0600: other users cannot send G-code.
+"""
+import collections
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+
+from capture import SerialTap, TX, RX
+
+
+def runtime_dir():
+    """
+    :return: the private directory of the default console socket, not created
+    """
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base:
+        return os.path.join(base, 'enderscope')
+    return os.path.join(tempfile.gettempdir(), f'enderscope-{os.getuid()}')
+
+
+if hasattr(socket, 'AF_UNIX'):
+    ADDRESS = os.path.join(runtime_dir(), 'console.sock')
+else:  # Windows
+    ADDRESS = '127.0.0.1:5001'
+
+
+def _split_address(address):
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def _private_dir(directory):
+    """
+    Creates directory with mode 0700 if needed
+    :raises PermissionError: it belongs to another user or others can reach it
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{directory} must belong to this user with mode 0700")
+
+
+def connect_console(address=ADDRESS):
+    """
+    :param str address: unix socket path, or host:port
+    :return: a socket connected to a ConsoleServer
+    """
+    family, target = _split_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(target)
+    return sock
+
+
+class ConsoleTap(SerialTap):
+    """
+    Port wrapper handing its traffic to a ConsoleServer
+    """
+
+    def __init__(self, ser, events):
+        super().__init__(ser)
+        self.__dict__['_events'] = events
+
+    def tap(self, direction, data):
+        self._events.put((time.perf_counter(), direction, bytes(data)))
+
+
+class ConsoleServer:
+    """
+    Local socket server of the consoles, follows the stage it is attached to
+    """
+
+    def __init__(self, address=ADDRESS, interval=1.0):
+        """
+        :param str address: unix socket path, or host:port
+        :param float interval: s between throughput and latency lines
+        """
+        self.address = address
+        self.interval = interval
+        self.stage = None
+        self._tap = None
+        self._events = queue.SimpleQueue()
+        self._clients = []
+        self._clients_lock = threading.Lock()
+        self._running = False
+        family, target = _split_address(address)
+        if family == socket.AF_UNIX:
+            if address == ADDRESS:
+                _private_dir(os.path.dirname(target))
+            if os.path.exists(target):
+                os.unlink(target)  # left over by a server that did not exit cleanly
+        self._server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(target)
+        if family == socket.AF_UNIX:
+            os.chmod(target, 0o600)
+        self._server.listen()
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._broadcast, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self.detach()
+        self._events.put(None)
+        self._server.close()
+        with self._clients_lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+        family, target = _split_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.unlink(target)
+
+    def attach(self, stage):
+        """
+        Follows stage, its traffic is tapped while consoles are connected; a
+        Klipper stage only shows the console's own commands
+        """
+        self.detach()
+        with self._clients_lock:
+            self.stage = stage
+            if self._clients:
+                self._install_tap()
+        self.send(f"## attaché à {stage.port} ({stage.backend.name})")
+
+    def detach(self):
+        with self._clients_lock:
+            self._remove_tap()
+            self.stage = None
+
+    def _install_tap(self):
+        # with _clients_lock held, like _remove_tap
+        stage = self.stage
+        if stage is not None and self._tap is None and stage.ser is not None:
+            self._tap = ConsoleTap(stage.serial, self._events)
+            stage.serial = self._tap
+
+    def _remove_tap(self):
+        stage, tap = self.stage, self._tap
+        if stage is not None and tap is not None and stage.serial is tap:
+            stage.serial = tap._ser
+        self._tap = None
+
+    def send(self, text, client=None):
+        """
+        Writes lines to one client, or to all of them
+        """
+        data = (text + '\n').encode('utf-8', errors='replace')
+        with self._clients_lock:
+            clients = [client] if client else list(self._clients)
+        for c in clients:
+            try:
+                c.sendall(data)
+            except OSError:
+                self._drop(c)
+
+    def _drop(self, client):
+        with self._clients_lock:
+            if client in self._clients:
+                self._clients.remove(client)
+            if not self._clients:
+                self._remove_tap()
+        client.close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                break
+            with self._clients_lock:
+                self._clients.append(client)
+                self._install_tap()
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        stage = self.stage
+        self.send(f"## attaché à {stage.port} ({stage.backend.name})" if stage else "## aucune platine connectée",
+                  client)
+        with client.makefile('r', encoding='utf-8', errors='replace') as lines:
+            try:
+                for line in lines:
+                    self._command(line.strip(), client)
+            except OSError:
+                pass
+        self._drop(client)
+
+    def _command(self, code, client):
+        if not code:
+            return
+        stage = self.stage
+        if stage is None:
+            self.send("!! aucune platine connectée", client)
+            return
+        try:
+            replies = stage.query(code)
+        except (RuntimeError, TimeoutError, OSError) as e:
+            self.send(f"!! {e}", client)
+            return
+        if self._tap is None:
+            # no tap on a Klipper stage, the replies are all there is to show
+            self.send(f">> {code}")
+            for reply in replies:
+                self.send(f"<< {reply}")
+
+    def _broadcast(self):
+        pending = {TX: b'', RX: b''}
+        written = collections.deque()
+        commands = 0
+        latencies = []
+        next_report = time.monotonic() + self.interval
+        while True:
+            try:
+                event = self._events.get(timeout=max(0.0, next_report - time.monotonic()))
+            except queue.Empty:
+                event = ()
+            if event is None:
+                break
+            if event:
+                t, direction, data = event
+                if direction == TX and b'\n' not in data:
+                    self.send(f">> {data!r}")  # realtime byte
+                    continue
+                buffer = pending[direction] + data
+                *lines, pending[direction] = buffer.split(b'\n')
+                for line in lines:
+                    line = line.strip().decode('utf-8', errors='replace')
+                    if not line:
+                        continue
+                    if direction == TX:
+                        written.append(t)
+                        commands += 1
+                        self.send(f">> {line}")
+                    else:
+                        if line.startswith(('ok', 'error')) and written:
+                            latencies.append(t - written.popleft())
+                        self.send(f"<< {line}")
+            now = time.monotonic()
+            if now >= next_report:
+                if commands:
+                    elapsed = self.interval + now - next_report
+                    report = f"## {commands / elapsed:.1f} cmd/s"
+                    if latencies:
+                        report += (f", ack {1000 * sum(latencies) / len(latencies):.1f} ms moy.,"
+                                   f" {1000 * max(latencies):.1f} ms max")
+                    self.send(report)
+                commands = 0
+                latencies = []
+                next_report = now + self.interval
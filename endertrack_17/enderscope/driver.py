@@ -0,0 +1,843 @@
+"""
+Serial drivers of the Enderscope: stage, illumination and port discovery.
+
+Only needs pyserial, so the hardware server, the bridges and scripts import
+it without the notebook dependencies of enderscope.py.
+"""
+import re
+import math
+import time
+import glob
+import sys
+import threading
+import serial
+import serial.tools.list_ports
+from telemetry import REGISTRY, get_logger
+from connect import open_serial, wait_ready
+from capture import CaptureSerial
+from responses import parse_line
+from supervisor import update_modal, restore_commands, LINK_ERRORS
+from backends import select_backend, KlipperBackend, MoonrakerClient
+
+G_CODES = {
+    'absolute': 'G90',
+    'relative': 'G91',
+    'homing': 'G28',
+    'finish': 'M400',
+    'set_speed_limit': 'M203',    
+    'current_position': 'M114'
+}
+SERIAL_BYTES = REGISTRY.counter('enderscope_serial_bytes_total',
+                                'Bytes exchanged with serial devices', ['direction'])
+SERIAL_COMMANDS = REGISTRY.counter('enderscope_serial_commands_total',
+                                   'Commands written to serial devices', ['command'])
+ACK_SECONDS = REGISTRY.histogram('enderscope_serial_ack_seconds',
+                                 'Time from writing a command to its ok', ['command'])
+log = get_logger('stage')
+DIRECTION_PREFIXES = {
+    "north": "Y",
+    "south": "Y-",
+    "east": "X",
+    "west": "X-",
+    "up": "Z",
+    "down": "Z-"
+}
+COMMENT = re.compile(r'\([^)]*\)')
+
+
+def clean_lines(lines):
+    """
+    Strips comments and blank lines from raw G-code
+    :param lines: iterable of str or bytes lines, consumed lazily
+    :return: generator of G-code lines
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.split(';', 1)[0]
+        if '(' in line:
+            line = COMMENT.sub('', line)
+        line = line.strip()
+        if line:
+            yield line
+
+
+class SerialUtils:
+
+    def serial_ports():
+        """ Lists serial port names
+        		from: https://stackoverflow.com/a/14224477
+            :raises EnvironmentError:
+                On unsupported or unknown platforms
+            :returns:
+                A list of the serial ports available on the system
+        """
+        if sys.platform.startswith('win'):
+            ports = [f'COM{i + 1}' for i in range(256)]
+        elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
+            # this excludes your current terminal "/dev/tty"
+            ports = glob.glob('/dev/tty[A-Za-z]*')
+        elif sys.platform.startswith('darwin'):
+            ports = glob.glob('/dev/tty.*')
+        else:
+            raise EnvironmentError('Unsupported platform')
+    
+        result = []
+        for port in ports:
+            try:
+                s = serial.Serial(port)
+                s.close()
+                result.append(port)
+            except (OSError, serial.SerialException):
+                pass
+        return result
+
+    def list_ports():
+        """
+        Lists the serial ports known to the OS without opening them
+        """
+        return [port.device for port in serial.tools.list_ports.comports()]
+
+
+class SerialDevice:
+    def __init__(self, port, baud_rate, parity=serial.PARITY_NONE,
+                 stop_bits=serial.STOPBITS_ONE, byte_size=serial.EIGHTBITS,
+                 dtr_reset=False, capture=None):
+        """
+        :param bool dtr_reset: reset the board through DTR when opening the port
+        :param str capture: file to record the traffic to, see capture.py
+        """
+        self.dtr_reset = dtr_reset
+        self.serial = open_serial(port, baud_rate, dtr_reset=dtr_reset,
+                                  parity=parity, stopbits=stop_bits,
+                                  bytesize=byte_size)
+        self.capture = None
+        if capture:
+            self.serial = self.capture = CaptureSerial(self.serial, capture)
+
+    @property
+    def port(self):
+        return self.serial.port
+
+    @property
+    def ser(self):
+        return self.serial
+
+    def close(self):
+        if self.serial.is_open:
+            self.serial.close()
+        if self.capture:
+            self.capture.end()
+
+    def reconnect(self):
+        """
+        Closes and reopens the serial port, e.g. after a USB hiccup
+        """
+        if self.serial.is_open:
+            try:
+                self.serial.close()
+            except (serial.SerialException, OSError):
+                pass
+        self.serial.open()
+        self.flush_serial_buffer()
+
+    def flush_serial_buffer(self):
+        while self.serial.in_waiting > 0:
+            self.serial.read()
+
+    def write_code(self, code):
+        if not code.endswith("\n"):
+            code += "\n"
+        data = bytes(code, "utf-8")
+        self.serial.write(data)
+        SERIAL_BYTES.labels(direction='out').inc(len(data))
+
+    def read_line(self):
+        line = self.serial.readline()
+        SERIAL_BYTES.labels(direction='in').inc(len(line))
+        return line.decode('utf-8')
+
+    def read_reply(self):
+        """
+        Reads a line and parses it without decoding it
+        :return: typed result from responses.parse_line, None on timeout
+        """
+        line = self.serial.readline()
+        if not line:
+            return None
+        SERIAL_BYTES.labels(direction='in').inc(len(line))
+        return parse_line(line.rstrip(b'\r\n'))
+
+class Stage(SerialDevice):
+    """
+    This is the 3 axis stage that moves the sample
+    """
+
+    def __init__(self, port, baud_rate=115200, homing=False, parity=serial.PARITY_NONE,
+                 stop_bits=serial.STOPBITS_ONE, byte_size=serial.EIGHTBITS,
+                 dtr_reset=False, ready_timeout=10.0, ack_timeout=None, backend=None, capture=None):
+        """
+        :param bool dtr_reset: reset the board through DTR when opening the port
+        :param str capture: file to record the serial traffic to, see capture.py
+        :param float ready_timeout: how long to wait for the firmware to answer in s
+        :param float ack_timeout: s without any line from the firmware before a
+            command fails with TimeoutError, None waits forever
+        :param backend: Backend class of the firmware, None detects it
+        """
+        self.ready_timeout = ready_timeout
+        self.lock = threading.RLock()
+        self.modal = {}
+        self.position = None
+        self.connected = True
+        self.on_link_error = None
+        # runlog.RunLog recording the commands, acks and positions
+        self.run_log = None
+        self._jog = None
+        self._jog_restore = []
+        self._jog_thread = None
+        self._jog_stop = threading.Event()
+        self.jog_error = None
+        self._open(port, baud_rate, parity, stop_bits, byte_size, dtr_reset, capture, ack_timeout, backend)
+        if homing==True:
+            self.home()
+
+    def _open(self, port, baud_rate, parity, stop_bits, byte_size, dtr_reset, capture, ack_timeout, backend):
+        """
+        Opens the link and sets firmware_info and backend, the hook subclasses
+        for other links override
+        """
+        super().__init__(port, baud_rate, parity, stop_bits, byte_size, dtr_reset, capture)
+        self.serial.timeout = ack_timeout
+        self.firmware_info = wait_ready(self.serial, self.ready_timeout)
+        self.backend = (backend or select_backend)(self)
+        
+    def reconnect(self):
+        """
+        Reopens the port, restores units, G90/G91 and feedrate and re-reads the position
+        """
+        with self.lock:
+            super().reconnect()
+            self.firmware_info = wait_ready(self.serial, self.ready_timeout)
+            for code in restore_commands(self.modal):
+                self.write_code(code)
+            if not self.heartbeat():
+                raise TimeoutError(f"{self.serial.port} does not answer M114")
+            self.connected = True
+
+    def heartbeat(self, timeout=3.0):
+        """
+        Checks that the firmware answers M114 and refreshes self.position
+        :param float timeout: s to wait for the report
+        :return: True if it answered
+        """
+        with self.lock:
+            previous = self.serial.timeout
+            self.serial.timeout = timeout
+            try:
+                position = self.get_position(dict=True)
+            except (KeyError, IndexError, ValueError):
+                position = None
+            finally:
+                self.serial.timeout = previous
+        if position:
+            self.position = position
+        return bool(position)
+
+    def write_code(self, code, check_ok=True, debug=False):
+        command = code.split(maxsplit=1)[0] if code.strip() else ''
+        SERIAL_COMMANDS.labels(command=command).inc()
+        run_log = self.run_log
+        with self.lock:
+            start = time.perf_counter()
+            if run_log:
+                run_log.command(code)
+            try:
+                super().write_code(code)
+                response = self.read_line()
+                if check_ok:
+                    while not response.startswith("ok"):
+                        if not response:
+                            raise TimeoutError(f"no reply to {command} within {self.serial.timeout} s")
+                        if response.startswith(("error:", "ALARM:")):
+                            # GRBL rejects a line instead of acknowledging it
+                            raise RuntimeError(f"{command}: {response.strip()}")
+                        if debug:
+                            print (response.strip('\n'))
+                        response = self.read_line()
+            except (serial.SerialException, OSError, TimeoutError, RuntimeError) as e:
+                if run_log:
+                    run_log.error(str(e))
+                if self.on_link_error and not isinstance(e, RuntimeError):
+                    self.on_link_error(e)
+                raise
+            if check_ok:
+                latency = time.perf_counter() - start
+                ACK_SECONDS.labels(command=command).observe(latency)
+                if run_log:
+                    run_log.ack(code, latency)
+            update_modal(self.modal, code)
+        if debug:
+            print(code)        
+        return response
+
+    def send_gcode(self, code, debug=False):
+        """
+        Sends a raw G-code line and waits for its ok
+        :return: the firmware response
+        """
+        return self.write_code(code, debug=debug)
+
+    def query(self, code):
+        """
+        Sends a command and collects its report
+        :return: the lines received before the ok
+        """
+        with self.lock:
+            lines = []
+            self.flush_serial_buffer()
+            response = self.write_code(code, check_ok=False)
+            while not response.startswith("ok"):
+                if not response:
+                    raise TimeoutError(f"no reply to {code} within {self.serial.timeout} s")
+                if response.startswith(("error:", "ALARM:")):
+                    raise RuntimeError(f"{code}: {response.strip()}")
+                lines.append(response.strip())
+                response = self.read_line()
+        return lines
+
+    @staticmethod
+    def numbered_line(n, code):
+        """
+        :return: code prefixed with line number n and suffixed with its checksum
+        """
+        line = f"N{n} {code}"
+        checksum = 0
+        for c in line.encode('utf-8'):
+            checksum ^= c
+        return f"{line}*{checksum}"
+
+    def stream(self, lines, window=None, numbered=True, reset_line_numbers=True, progress=None):
+        """
+        Sends G-code lines with flow control: up to window lines are waiting
+        for their ok, so the firmware queue never runs dry nor overflows.
+        Numbered lines carry a checksum and are resent when the firmware asks.
+        GRBL is fed by character counting instead, Klipper by scripts of
+        window lines.
+        :param lines: iterable of G-code lines, consumed lazily
+        :param int window: lines in flight, lines per script on Klipper,
+            None for the backend's stream_window (4, Klipper 50)
+        :param bool numbered: add line numbers and checksums
+        :param bool reset_line_numbers: start numbering with M110 N0
+        :param progress: called as progress(sent, acked) after each ok
+        :return: the number of lines acknowledged
+        :raises RuntimeError: on a firmware error other than a resend request
+        """
+        if window is None:
+            window = self.backend.stream_window
+        try:
+            return self.backend.stream(lines, window, numbered, reset_line_numbers, progress)
+        except (serial.SerialException, OSError) as e:
+            if self.on_link_error:
+                self.on_link_error(e)
+            raise
+
+    def write_raw(self, code):
+        """
+        Writes a line without waiting for its reply, for the streaming backends
+        """
+        if self.run_log:
+            self.run_log.command(code)
+        SerialDevice.write_code(self, code)
+
+    def emergency_stop(self, reset=True):
+        """
+        Stops straight away, without waiting for the command in progress
+        (M112 on Marlin, feed hold and reset on GRBL)
+        :param bool reset: leave the stopped state afterwards (M999 on Marlin)
+        """
+        self.backend.emergency_stop(reset)
+
+    def start_jog(self, vector, speed, segment_time=0.05, lookahead=0.25, timeout=None):
+        """
+        Moves continuously along vector until stop_jog()
+        Short relative segments are queued so the planner blends them into one
+        smooth move. Calling start_jog again while jogging changes direction
+        and speed on the fly.
+        :param vector: (dx, dy) or (dx, dy, dz) direction, its length does not matter
+        :param float speed: mm/min
+        :param float segment_time: duration of each segment in s
+        :param float lookahead: s of motion queued ahead of the stage
+        :param float timeout: stop unless start_jog is called again within timeout s
+        A segment refused by the firmware ends the jog, the reason is kept in jog_error.
+        """
+        vector = tuple(vector) + (0.0,) * (3 - len(vector))
+        norm = math.sqrt(sum(c * c for c in vector))
+        if not norm or speed <= 0:
+            return self.stop_jog()
+        self._jog = {
+            'direction': tuple(c / norm for c in vector),
+            'speed': speed,
+            'segment_time': segment_time,
+            'lookahead': lookahead,
+            'deadline': time.monotonic() + timeout if timeout else None,
+        }
+        with self.lock:
+            if self._jog_thread is None or not self._jog_thread.is_alive():
+                self._jog_restore = []
+                if self.backend.jog_modal:
+                    self._jog_restore.append(self.modal.get('distance', G_CODES['absolute']))
+                    # the segments' F stays modal, put back the one moves had before
+                    self._jog_restore.append(f"G0 F{self.modal.get('feedrate', self.backend.default_feedrate)}")
+                self.jog_error = None
+                self._jog_stop.clear()
+                self._jog_thread = threading.Thread(target=self._run_jog, daemon=True)
+                self._jog_thread.start()
+
+    def _run_jog(self):
+        queued_until = time.monotonic()
+        try:
+            if self.backend.jog_modal:
+                self.write_code(G_CODES['relative'])
+            while not self._jog_stop.is_set():
+                jog = self._jog
+                now = time.monotonic()
+                if jog['deadline'] and now > jog['deadline']:
+                    break
+                ahead = queued_until - now
+                if ahead > jog['lookahead']:
+                    self._jog_stop.wait(ahead - jog['lookahead'])
+                    continue
+                step = jog['speed'] / 60.0 * jog['segment_time']
+                words = ' '.join(f"{axis}{c * step:.4f}" for axis, c in zip('XYZ', jog['direction']) if c)
+                self.write_code(self.backend.jog_command(words, jog['speed']))
+                queued_until = max(queued_until, now) + jog['segment_time']
+        except LINK_ERRORS:
+            return
+        except RuntimeError as e:
+            # the firmware refused a segment, the jog is over
+            log.error("❌ Jog interrompu: %s", e)
+            self.jog_error = str(e)
+            self._jog = None
+            try:
+                self._restore_after_jog()
+            except (RuntimeError, *LINK_ERRORS) as e:
+                log.error("❌ Mode de déplacement non restauré: %s", e)
+            return
+        if not self._jog_stop.is_set():
+            # timed out, the queued segments finish within lookahead
+            self._jog = None
+            self._restore_after_jog()
+
+    def _restore_after_jog(self):
+        """
+        Puts back the distance mode and feedrate the jog changed, once
+        """
+        with self.lock:
+            restore, self._jog_restore = self._jog_restore, []
+            for code in restore:
+                self.write_code(code)
+
+    def stop_jog(self, timeout=1.0):
+        """
+        Stops a jog: the queued segments are dropped (M410 on Marlin, jog
+        cancel on GRBL) and the position is read back from the firmware
+        Klipper has no such stop short of an emergency stop: the stage halts
+        once the segments already queued, up to lookahead s of motion, are done.
+        :param float timeout: s to wait for the stop acknowledgement
+        :return: the position after the stop as a dict, None if not jogging
+        """
+        thread = self._jog_thread
+        if thread is None:
+            return None
+        self._jog_stop.set()
+        # not queued behind the segment waiting for its ok
+        acks = self.backend.quick_stop()
+        thread.join()
+        self._jog_thread = None
+        self._jog = None
+        with self.lock:
+            self._drain_acks(acks, timeout)
+            self._restore_after_jog()
+            self.position = self.get_position(dict=True)
+        return self.position
+
+    def _drain_acks(self, count, timeout):
+        if not count:
+            return
+        previous = self.serial.timeout
+        self.serial.timeout = timeout
+        try:
+            while count > 0:
+                response = self.read_line()
+                if not response:
+                    break
+                if response.startswith("ok"):
+                    count -= 1
+        finally:
+            self.serial.timeout = previous
+
+    def close(self):
+        self.stop_jog()
+        self.connected = False
+        super().close()
+
+    def set_speed(self, speed, debug=False):
+        """
+        Sets the speed of the stage
+        :param speed: speed in mm/min
+        :return:
+        """
+        code = f"G0 F{speed}"
+        self.write_code(code, debug=debug)
+
+    def set_speed_limit(self, speed, axis='x', debug=False):
+        """
+        Sets the speed of the stage
+
+        :param float speed: speed in mm/min
+        :param str axis: axis to set speed for, one of 'x', 'y', 'z'
+        :param bool debug: print the command to be sent
+        """
+        self.write_code(f'{G_CODES["set_speed_limit"]} {axis.upper()}{speed}',
+                        debug=debug)
+
+    def move_absolute(self, x, y, z=None, debug=False):
+        """
+        Moves the stage to the given coordinates
+        :param x:
+        :param y:
+        :param z:
+        :return:
+        """
+        self.set_absolute()
+        if z is None:
+            code = f"G0 X {x} Y {y}"
+        else:
+            code = f"G0 X {x} Y {y} Z {z}"
+        self.write_code(code, debug=debug)
+
+    def move_position(self, p, debug=False):
+        """
+        Moves the stage to the given position
+        :param p: position
+        :return:
+        """
+        if p is not None:
+            self.set_absolute()
+            if len(p)<3 :
+                x,y = p
+                code = f"G0 X {x} Y {y}"
+            else:
+                x,y,z = p
+                code = f"G0 X {x} Y {y} Z {z}"
+            self.write_code(code, debug=debug)
+            
+    def move_relative(self, x, y, z=None, debug=False):
+        """
+        Moves the stage by given mm distance, then goes back to absolute positioning
+        :param x:
+        :param y:
+        :param z:
+        :return:
+        """
+        self.set_relative(debug=debug)
+        if z is None:
+            code = f"G0 X {x} Y {y}"
+        else:
+            code = f"G0 X {x} Y {y} Z {z}"
+        if debug:
+            print(code)
+        self.write_code(code, debug=debug)
+        self.set_absolute(debug=debug)
+
+    def move_towards(self, direction, distance, debug=False):
+        """
+        Moves the stage in the given direction, then goes back to absolute positioning
+        :param direction:
+        :return:
+        """
+        self.set_relative()
+        if direction.lower() in ('up', 'down'):
+            code = f"G0 {DIRECTION_PREFIXES[direction.lower()]}{distance}"
+        else:
+            code = f"G0 {DIRECTION_PREFIXES[direction.lower()]}{distance}"
+        self.write_code(code, debug=debug)
+        self.set_absolute()
+
+    def move_axis(self, axis, distance, debug=False):
+        """
+        Moves the stage along the given axis, then goes back to absolute positioning
+        :param distance:
+        :return:
+        """
+        self.set_relative()
+        code = f"G0 {axis.upper()}{distance}"
+        self.write_code(code, debug=debug)
+        self.set_absolute()
+
+    def get_position(self, dict=False, debug=False):
+        positions = self.backend.position()
+        if debug:
+            print(positions)
+        if positions is None:
+            print("Error reading stage position")
+            return
+        if self.run_log:
+            self.run_log.position(positions['X'], positions['Y'], positions['Z'])
+        if dict==False:
+            order = ['X','Y', 'Z']
+            positions = tuple([positions[field] for field in order])
+        return positions
+
+    def home(self, debug=False):
+        self.write_code(self.backend.home_code, debug=debug)
+
+    def finish_moves(self, debug=False):
+        self.backend.wait_idle()
+    def set_relative(self, debug=False):
+        self.write_code(G_CODES['relative'], debug=debug)
+
+    def set_absolute(self, debug=False):
+        self.write_code(G_CODES['absolute'], debug=debug)
+
+class KlipperStage(Stage):
+    """
+    Stage driven by Klipper through Moonraker's JSON-RPC unix socket
+    The position is pushed by Moonraker, get_position() costs no round trip.
+    """
+
+    def __init__(self, path, homing=False, ready_timeout=10.0, ack_timeout=None, **serial_options):
+        """
+        :param str path: Moonraker unix socket, e.g. ~/printer_data/comms/moonraker.sock
+        :param float ready_timeout: s to wait for Moonraker to answer
+        :param float ack_timeout: s to wait for a script to complete, None waits forever
+        :param serial_options: ignored, so open_stage() passes the same options to both stages
+        """
+        self.path = path
+        self.ack_timeout = ack_timeout
+        super().__init__(path, homing=homing, ready_timeout=ready_timeout, ack_timeout=ack_timeout)
+
+    def _open(self, port, *serial_options):
+        self._connect()
+
+    def _connect(self):
+        client = MoonrakerClient(self.path, timeout=self.ready_timeout)
+        client.on_close = self._closed
+        info = client.call('printer.info')
+        self.firmware_info = [f"FIRMWARE_NAME:Klipper {info.get('software_version', '')}".strip()]
+        self.backend = KlipperBackend(self, client)
+
+    def _closed(self, error):
+        if self.on_link_error:
+            self.on_link_error(error)
+
+    @property
+    def port(self):
+        return self.path
+
+    @property
+    def ser(self):
+        return None
+
+    def reconnect(self):
+        with self.lock:
+            self.backend.client.close()
+            self._connect()
+            for code in restore_commands(self.modal):
+                self.write_code(code)
+            self.heartbeat()
+            self.connected = True
+
+    def heartbeat(self, timeout=3.0):
+        result = self.backend.client.call('printer.objects.query',
+                                          {'objects': {'toolhead': ['position']}}, timeout)
+        self.backend._update(result.get('status', {}))
+        return True
+
+    def write_code(self, code, check_ok=True, debug=False):
+        command = code.split(maxsplit=1)[0] if code.strip() else ''
+        SERIAL_COMMANDS.labels(command=command).inc()
+        run_log = self.run_log
+        with self.lock:
+            start = time.perf_counter()
+            if run_log:
+                run_log.command(code)
+            try:
+                self.backend.script(code, self.ack_timeout)
+            except (OSError, TimeoutError, RuntimeError) as e:
+                if run_log:
+                    run_log.error(str(e))
+                if self.on_link_error and not isinstance(e, RuntimeError):
+                    self.on_link_error(e)
+                raise
+            latency = time.perf_counter() - start
+            ACK_SECONDS.labels(command=command).observe(latency)
+            if run_log:
+                run_log.ack(code, latency)
+            update_modal(self.modal, code)
+        if debug:
+            print(code)
+        return "ok"
+
+    def query(self, code):
+        with self.lock:
+            return self.backend.query(code, self.ack_timeout)
+
+    def flush_serial_buffer(self):
+        pass
+
+    def close(self):
+        self.stop_jog()
+        self.connected = False
+        self.backend.client.close()
+
+
+def open_stage(target, **options):
+    """
+    Opens the stage behind target with the backend of its firmware
+    :param str target: serial port, or Moonraker socket as 'moonraker:<path>' or a path ending in .sock
+    :param options: Stage options (baud_rate, dtr_reset, ack_timeout...)
+    :return: Stage or KlipperStage
+    """
+    if target.startswith('moonraker:'):
+        return KlipperStage(target[len('moonraker:'):], **options)
+    if target.endswith('.sock'):
+        return KlipperStage(target, **options)
+    return Stage(target, **options)
+
+ENDERLIGHTS_CHANNELS = ('S', 'M', 'MA', 'P', 'R', 'G', 'B')
+
+class Enderlights(SerialDevice):
+    """
+    An illumination device built from an Arduino board and a neopixels RGB leds ring
+
+    Every token is sent as its own line, the shipped firmware takes one token
+    per line. Firmwares that implement frames (space separated tokens on a
+    single line applied before one ``ok``, see ENDERLIGHTS-PROTOCOL.md) can be
+    opened with ``batched=True``.
+    """
+
+    def __init__(self, port, baud_rate=9600, parity=serial.PARITY_NONE,
+                 stop_bits=serial.STOPBITS_ONE, byte_size=serial.EIGHTBITS,
+                 batched=False, dtr_reset=False):
+        super().__init__(port, baud_rate, parity, stop_bits, byte_size, dtr_reset)
+        self.batched = batched
+        self.state = {}
+
+    def reconnect(self):
+        """
+        Reopens the port and forgets the cached state, the board may have reset
+        """
+        self.state = {}
+        super().reconnect()
+
+    def write_code(self, code, check_ok=True, debug=False):
+        SERIAL_COMMANDS.labels(command='lights').inc()
+        start = time.perf_counter()
+        super().write_code(code)
+        response = self.read_line()
+        ACK_SECONDS.labels(command='lights').observe(time.perf_counter() - start)
+        if not response.startswith("ok"):
+            print (response.strip('\n'))
+        return response
+
+    def send_frame(self, channels, debug=False):
+        """
+        Sends channel values and records the acknowledged ones in the cached state
+        An error reply empties the cache: what the device applied is unknown,
+        the next set_state() resends every channel.
+        :param dict channels: values keyed by channel token ('S', 'M', 'MA', 'P', 'R', 'G', 'B')
+        :return: the firmware response, the first error one if any
+        """
+        sent = [c for c in ENDERLIGHTS_CHANNELS if c in channels]
+        tokens = [f"{c}{channels[c]}" for c in sent]
+        if debug:
+            print(' '.join(tokens))
+        frames = [(' '.join(tokens), sent)] if self.batched else [(t, [c]) for t, c in zip(tokens, sent)]
+        response = None
+        for frame, frame_channels in frames:
+            response = self.write_code(frame)
+            if not response.startswith("ok"):
+                self.state = {}
+                return response
+            self.state.update((c, channels[c]) for c in frame_channels)
+        return response
+
+    def set_state(self, shutter=None, mode=None, parameter=None, rgb=None,
+                  mask=None, force=False, debug=False):
+        """
+        Updates several channels with a single write and a single ack
+        Channels left to None are untouched, channels already at the requested
+        value are not resent unless force is True.
+        :param bool shutter: virtual shutter state
+        :param int mode: lighting mode
+        :param int parameter: mode parameter
+        :param rgb: (r, g, b) levels
+        :param int mask: leds mask
+        :return: the firmware response, None if nothing had to be sent
+        """
+        wanted = {}
+        if shutter is not None:
+            wanted['S'] = 1 if shutter else 0
+        if mode is not None:
+            wanted['M'] = mode
+        if mask is not None:
+            wanted['MA'] = mask
+        if parameter is not None:
+            wanted['P'] = parameter
+        if rgb is not None:
+            wanted['R'], wanted['G'], wanted['B'] = rgb
+        changes = {c: v for c, v in wanted.items()
+                   if force or self.state.get(c) != v}
+        if not changes:
+            return None
+        return self.send_frame(changes, debug=debug)
+
+    def shutter(self, s):
+        """
+        Opens or closes a virtual shutter
+        """
+        self.send_frame({'S': 1 if s==True else 0})
+
+    def mode(self, value):
+        """
+        switches modes
+        """
+        self.send_frame({'M': value})
+
+    def parameter(self, value):
+        """
+        switches modes
+        """
+        self.send_frame({'P': value})
+
+    def red(self, value):
+        """
+        sets red level
+        """
+        self.send_frame({'R': value})
+
+    def green(self, value):
+        """
+        sets green level
+        """
+        self.send_frame({'G': value})
+
+    def blue(self, value):
+        """
+        sets green level
+        """
+        self.send_frame({'B': value})
+
+    def color(self, r,g,b):
+        """
+        sets rgb levels, only the changed ones are sent
+        """
+        self.set_state(rgb=(r, g, b))
+
+    def reset(self):
+        """
+        resets illuminator
+        """
+        self.set_state(shutter=False, mode=0, mask=65535, rgb=(20, 20, 20),
+                       force=True)
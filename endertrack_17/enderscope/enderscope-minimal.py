@@ -1,7 +1,8 @@
 # enderscope-minimal.py - Version ultra-simple sans dépendances
 import serial
 import serial.tools.list_ports
-import time
+
+from connect import open_serial, wait_ready
 
 class SerialUtils:
     @staticmethod
@@ -13,15 +14,15 @@ class SerialUtils:
         return ports
 
 class Stage:
-    def __init__(self, port, baudrate=115200, homing=False):
+    def __init__(self, port, baudrate=115200, homing=False, dtr_reset=False, ready_timeout=10.0):
         """Initialise la connexion avec l'Enderscope"""
         self.port = port
         self.baudrate = baudrate
         self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
         
-        # Connexion série ultra-simple
-        self.ser = serial.Serial(port, baudrate, timeout=0.1)
-        time.sleep(0.5)  # Attente courte
+        # Connexion série ultra-simple, sans reset DTR par défaut
+        self.ser = open_serial(port, baudrate, dtr_reset=dtr_reset, timeout=0.1)
+        wait_ready(self.ser, deadline=ready_timeout)  # Premier ok du firmware
         
         print(f"✅ Connecté à {port} à {baudrate} bauds")
     
@@ -0,0 +1,253 @@
+"""
+Continuous-motion (fly) scans along raster rows.
+
+Stop-and-go scans spend most of their time accelerating and decelerating.
+FlyScan crosses each row in a single move at constant feedrate instead, and
+follows the stage with a trapezoidal motion model: estimates of the position
+are interpolated from the clock, corrected by sparse M114 reports, and user
+callbacks fire when the estimate crosses the requested coordinates::
+
+    scan = FlyScan(stage, feedrate=600, acceleration=500)
+    scan.run(raster_rows((0, 0), (10, 4), rows=5), spacing=0.5, on_trigger=acquire)
+
+Each row is lengthened by a run-in at both ends so the triggers fall in the
+constant velocity part of the move.
+"""
+import math
+import time
+
+from responses import parse_line, Position
+
+
+def raster_rows(start, end, rows, snake=True, z=None):
+    """
+    Rows along X covering the rectangle between two corners
+    :param start: (x, y) corner of the first row
+    :param end: (x, y) opposite corner
+    :param int rows: number of rows, evenly spaced in Y
+    :param bool snake: alternate the direction of the rows
+    :param float z: height of the rows, None keeps the current one
+    :return: list of ((x, y[, z]), (x, y[, z])) row ends
+    """
+    (x0, y0), (x1, y1) = start, end
+    step = (y1 - y0) / (rows - 1) if rows > 1 else 0.0
+    result = []
+    for i in range(rows):
+        y = y0 + i * step
+        a, b = (x0, y), (x1, y)
+        if snake and i % 2:
+            a, b = b, a
+        if z is not None:
+            a, b = a + (z,), b + (z,)
+        result.append((a, b))
+    return result
+
+
+class MotionModel:
+    """
+    Trapezoidal velocity profile of a straight move starting and ending at rest
+    """
+
+    def __init__(self, length, feedrate, acceleration):
+        """
+        :param float length: move length in mm
+        :param float feedrate: cruise speed in mm/min
+        :param float acceleration: mm/s², as configured in the firmware (M204)
+        """
+        self.length = length
+        self.acceleration = acceleration
+        speed = feedrate / 60.0
+        if length < speed * speed / acceleration:
+            # never reaches the cruise speed
+            speed = math.sqrt(acceleration * length)
+        self.speed = speed
+        self.ramp_time = speed / acceleration if acceleration else 0.0
+        self.ramp_length = 0.5 * speed * self.ramp_time
+        self.cruise_time = (length - 2 * self.ramp_length) / speed if speed else 0.0
+        self.duration = 2 * self.ramp_time + self.cruise_time
+
+    def distance_at(self, t):
+        """
+        :return: distance travelled t s after the start of the move
+        """
+        if t <= 0:
+            return 0.0
+        if t >= self.duration:
+            return self.length
+        if t < self.ramp_time:
+            return 0.5 * self.acceleration * t * t
+        t -= self.ramp_time
+        if t < self.cruise_time:
+            return self.ramp_length + self.speed * t
+        t = self.ramp_time - (t - self.cruise_time)
+        return self.length - 0.5 * self.acceleration * t * t
+
+    def time_at(self, distance):
+        """
+        :return: time after the start of the move at which distance is reached
+        """
+        if distance <= 0:
+            return 0.0
+        if distance >= self.length:
+            return self.duration
+        if distance < self.ramp_length:
+            return math.sqrt(2 * distance / self.acceleration)
+        if distance <= self.length - self.ramp_length:
+            return self.ramp_time + (distance - self.ramp_length) / self.speed
+        return self.duration - math.sqrt(2 * (self.length - distance) / self.acceleration)
+
+
+class FlyScan:
+    """
+    Raster scan with the stage moving while the callbacks fire
+    """
+
+    def __init__(self, stage, feedrate=600.0, acceleration=500.0, travel_feedrate=3000.0,
+                 run_in=None, rate=200.0, report_interval=0.25, report_command='M114 R',
+                 gain=0.5):
+        """
+        :param stage: a connected Stage
+        :param float feedrate: speed along the rows in mm/min
+        :param float acceleration: firmware acceleration in mm/s²
+        :param float travel_feedrate: speed of the moves between rows in mm/min
+        :param float run_in: mm added before and after each row, None for the
+            distance needed to reach feedrate
+        :param float rate: estimates per s passed to on_estimate
+        :param float report_interval: s between firmware position reports
+        :param str report_command: position query, 'M114 R' reports the real
+            position on firmwares built with M114_REALTIME
+        :param float gain: weight of each report in the time correction, 0 to 1
+        """
+        self.stage = stage
+        self.feedrate = feedrate
+        self.acceleration = acceleration
+        self.travel_feedrate = travel_feedrate
+        speed = feedrate / 60.0
+        self.run_in = speed * speed / (2 * acceleration) if run_in is None else run_in
+        self.rate = rate
+        self.report_interval = report_interval
+        self.report_command = report_command
+        self.gain = gain
+        self.offset = 0.0
+        self.corrections = []
+
+    def run(self, rows, spacing=None, triggers=None, on_trigger=None, on_estimate=None):
+        """
+        Scans the rows one after the other
+        :param rows: list of (start, end) positions, e.g. from raster_rows
+        :param float spacing: fire a trigger every spacing mm along each row
+        :param triggers: alternatively one list of (x, y) positions per row,
+            projected on the row
+        :param on_trigger: called as on_trigger(row, index, estimate) when the
+            stage passes a trigger, estimate being (t, x, y, z) with t on the
+            time.monotonic() clock and z None for 2D rows
+        :param on_estimate: called as on_estimate(t, x, y, z) at rate
+        :return: dict with rows, triggers fired, duration in s and the largest
+            time correction applied in s
+        """
+        start = time.monotonic()
+        fired = 0
+        self.corrections = []
+        self.stage.set_absolute()
+        for r, (a, b) in enumerate(rows):
+            length = math.dist(a[:2], b[:2])
+            if triggers is not None:
+                distances = [self._project(a, b, p) for p in triggers[r]]
+            elif spacing:
+                distances = [i * spacing for i in range(int(length / spacing + 1e-9) + 1)]
+            else:
+                distances = []
+            fired += self._run_row(r, a, b, distances, on_trigger, on_estimate)
+        return {
+            'rows': len(rows),
+            'triggers': fired,
+            'duration': time.monotonic() - start,
+            'max_correction': max((abs(c) for c in self.corrections), default=0.0),
+        }
+
+    @staticmethod
+    def _project(a, b, p):
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        length = math.hypot(dx, dy)
+        return ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length if length else 0.0
+
+    def _run_row(self, row, a, b, distances, on_trigger, on_estimate):
+        length = math.dist(a[:2], b[:2])
+        ux, uy = ((b[0] - a[0]) / length, (b[1] - a[1]) / length) if length else (0.0, 0.0)
+        z = a[2] if len(a) > 2 else None
+        run_in = self.run_in
+        origin = (a[0] - ux * run_in, a[1] - uy * run_in)
+        target = (b[0] + ux * run_in, b[1] + uy * run_in)
+        model = MotionModel(length + 2 * run_in, self.feedrate, self.acceleration)
+
+        def estimate(t):
+            s = model.distance_at(t)
+            return (origin[0] + ux * s, origin[1] + uy * s, z)
+
+        self.stage.write_code(self._move(origin, z, self.travel_feedrate))
+        self.stage.finish_moves()
+        self.stage.write_code(self._move(target, z, self.feedrate))
+        t0 = self._row_start = time.monotonic()
+        self.offset = 0.0
+        pending = sorted(run_in + d for d in distances)
+        fired = 0
+        next_estimate = t0
+        next_report = t0 + self.report_interval
+        while True:
+            now = time.monotonic()
+            t = now - t0 - self.offset
+            while pending and model.time_at(pending[0]) <= t:
+                if on_trigger:
+                    on_trigger(row, fired, (now,) + estimate(t))
+                pending.pop(0)
+                fired += 1
+            if on_estimate and now >= next_estimate:
+                on_estimate(now, *estimate(t))
+                next_estimate += 1.0 / self.rate
+            if t >= model.duration and not pending:
+                break
+            if now >= next_report:
+                self._correct(model, origin, ux, uy)
+                next_report = time.monotonic() + self.report_interval
+                continue
+            wake = [next_report, t0 + model.duration + self.offset]
+            if pending:
+                wake.append(t0 + self.offset + model.time_at(pending[0]))
+            if on_estimate:
+                wake.append(next_estimate)
+            time.sleep(max(0.0, min(wake) - time.monotonic()))
+        self.stage.finish_moves()
+        return fired
+
+    def _correct(self, model, origin, ux, uy):
+        """
+        Shifts the model clock so it agrees with a firmware position report
+        taken while the stage is between the ends of the move
+        """
+        sent = time.monotonic()
+        position = None
+        if self.stage.backend.supports('status_report') or self.stage.backend.supports('subscriptions'):
+            # real-time position without going through the command queue
+            position = self.stage.backend.position()
+        else:
+            for line in self.stage.query(self.report_command):
+                reply = parse_line(line.encode())
+                if isinstance(reply, Position):
+                    position = {'X': reply.x, 'Y': reply.y, 'Z': reply.z}
+        received = time.monotonic()
+        if position is None:
+            return
+        s = (position['X'] - origin[0]) * ux + (position['Y'] - origin[1]) * uy
+        if not 0.01 < s < model.length - 0.01:
+            # at rest at either end, the report does not date the move
+            return
+        started = received - (received - sent) / 2 - model.time_at(s)
+        error = started - self._row_start - self.offset
+        self.offset += self.gain * error
+        self.corrections.append(error)
+
+    def _move(self, position, z, feedrate):
+        code = f"G1 F{feedrate:g} X{position[0]:.3f} Y{position[1]:.3f}"
+        if z is not None:
+            code += f" Z{z:.3f}"
+        return code
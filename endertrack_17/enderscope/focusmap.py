@@ -0,0 +1,153 @@
+"""
+Focus surface of a sample: Z as a function of X and Y.
+
+A few in-focus positions measured across the slide or plate are enough to fit
+a plane, a quadratic or a thin-plate spline, which then gives Z for every
+tile of a scan in one vectorized call::
+
+    fmap = FocusMap.fit([(0, 0, 1.20), (40, 0, 1.32), (0, 30, 1.11), (40, 30, 1.25)])
+    path = fmap.apply(ScanPatterns.snake(20, 15) * 2)
+    ScanRunner(stage, path, 'slide-12.journal').run()
+
+Fitted maps are kept per sample holder in a JSON file by FocusMapStore.
+"""
+import json
+
+import numpy as np
+
+MIN_POINTS = {'plane': 3, 'quadratic': 6, 'tps': 3}
+
+
+def _polynomial(xy, kind):
+    x, y = xy[:, 0], xy[:, 1]
+    one = np.ones_like(x)
+    if kind == 'quadratic':
+        return np.column_stack((one, x, y, x * x, x * y, y * y))
+    return np.column_stack((one, x, y))
+
+
+def _tps_kernel(r):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = r * r * np.log(r)
+    return np.nan_to_num(k)
+
+
+class FocusMap:
+    """
+    Fitted focus surface
+    """
+
+    def __init__(self, kind, coefficients, centers=None, weights=None):
+        self.kind = kind
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.centers = None if centers is None else np.asarray(centers, dtype=float)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+
+    @classmethod
+    def fit(cls, points, kind='plane', smoothing=0.0):
+        """
+        Fits a surface through measured in-focus positions
+        :param points: sequence of (x, y, z)
+        :param str kind: 'plane', 'quadratic' or 'tps' (thin-plate spline)
+        :param float smoothing: tps only, 0 interpolates the points exactly
+        :return: FocusMap
+        :raises ValueError: on an unknown kind or too few points
+        """
+        if kind not in MIN_POINTS:
+            raise ValueError(f"unknown focus map kind {kind!r}, expected one of {sorted(MIN_POINTS)}")
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError("points must be (x, y, z) triples")
+        if len(points) < MIN_POINTS[kind]:
+            raise ValueError(f"a {kind} focus map needs at least {MIN_POINTS[kind]} points, got {len(points)}")
+        xy, z = points[:, :2], points[:, 2]
+        if kind != 'tps':
+            coefficients, *_ = np.linalg.lstsq(_polynomial(xy, kind), z, rcond=None)
+            return cls(kind, coefficients)
+        n = len(points)
+        p = _polynomial(xy, 'plane')
+        k = _tps_kernel(np.linalg.norm(xy[:, None, :] - xy[None, :, :], axis=-1))
+        system = np.zeros((n + 3, n + 3))
+        system[:n, :n] = k + smoothing * np.eye(n)
+        system[:n, n:] = p
+        system[n:, :n] = p.T
+        solution = np.linalg.lstsq(system, np.concatenate((z, np.zeros(3))), rcond=None)[0]
+        return cls(kind, solution[n:], centers=xy, weights=solution[:n])
+
+    def evaluate(self, xy):
+        """
+        :param xy: (n, 2) array of positions, or a single (x, y)
+        :return: Z at each position, a float for a single position
+        """
+        xy = np.asarray(xy, dtype=float)
+        single = xy.ndim == 1
+        xy = np.atleast_2d(xy)[:, :2]
+        z = _polynomial(xy, self.kind) @ self.coefficients
+        if self.kind == 'tps':
+            r = np.linalg.norm(xy[:, None, :] - self.centers[None, :, :], axis=-1)
+            z = z + _tps_kernel(r) @ self.weights
+        return float(z[0]) if single else z
+
+    def apply(self, path):
+        """
+        :param path: (n, 2) or (n, 3) positions, e.g. from ScanPatterns
+        :return: (n, 3) array with Z replaced by the focus surface
+        """
+        xy = np.asarray(path, dtype=float)[:, :2]
+        return np.column_stack((xy, self.evaluate(xy)))
+
+    def residuals(self, points):
+        """
+        :return: measured minus fitted Z at each (x, y, z) point
+        """
+        points = np.asarray(points, dtype=float)
+        return points[:, 2] - self.evaluate(points[:, :2])
+
+    def to_dict(self):
+        data = {'kind': self.kind, 'coefficients': self.coefficients.tolist()}
+        if self.kind == 'tps':
+            data['centers'] = self.centers.tolist()
+            data['weights'] = self.weights.tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['kind'], data['coefficients'], data.get('centers'), data.get('weights'))
+
+
+class FocusMapStore:
+    """
+    Focus maps of the sample holders, kept in a JSON file
+    """
+
+    def __init__(self, filename='focus-maps.json'):
+        self.filename = filename
+        self._maps = {}
+        try:
+            with open(filename) as f:
+                self._maps = {holder: FocusMap.from_dict(data) for holder, data in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+
+    def get(self, holder):
+        """
+        :return: the FocusMap of holder, None if it was never fitted
+        """
+        return self._maps.get(holder)
+
+    def put(self, holder, fmap):
+        self._maps[holder] = fmap
+        with open(self.filename, 'w') as f:
+            json.dump({h: m.to_dict() for h, m in self._maps.items()}, f)
+
+    def fit(self, holder, points, kind='plane', smoothing=0.0):
+        """
+        Fits a focus map and stores it for holder
+        :return: FocusMap
+        """
+        fmap = FocusMap.fit(points, kind, smoothing)
+        self.put(holder, fmap)
+        return fmap
+
+    def holders(self):
+        return sorted(self._maps)
@@ -1,55 +1,151 @@
 #!/usr/bin/env python3
 # enderscope/hardware-server.py - Flask server for Enderscope hardware control
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
+import atexit
 import sys
 import os
+import json
+import queue
+import threading
 import time
 
 # Add current directory to path to import enderscope module
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Import enderscope-simple for debugging
+from telemetry import REGISTRY, CONTENT_TYPE, setup_logging, get_logger
+from supervisor import LinkSupervisor
+from history import PositionHistory, PositionSampler
+from runlog import RunLog
+from livepos import PositionPublisher
+from console import ConsoleServer, ADDRESS as CONSOLE_DEFAULT
+
+setup_logging()
+log = get_logger('server')
+
+# Import the shared Enderscope driver (pyserial only)
 try:
-    import importlib.util
-    
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    simple_path = os.path.join(script_dir, "enderscope-simple.py")
-    
-    spec = importlib.util.spec_from_file_location("enderscope_simple", simple_path)
-    enderscope_simple = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(enderscope_simple)
-    
-    Stage = enderscope_simple.Stage
-    SerialUtils = enderscope_simple.SerialUtils
-    print("✅ Successfully imported enderscope-simple module")
+    from driver import Stage, SerialUtils, clean_lines, open_stage
+    log.info("✅ Successfully imported enderscope driver")
 except ImportError as e:
     error_msg = str(e)
     if "serial" in error_msg.lower():
-        print("❌ Cannot import enderscope-simple: pyserial manquant")
-        print("📝 Pour installer: pip install pyserial")
+        log.error("❌ Cannot import enderscope driver: pyserial manquant")
+        log.error("📝 Pour installer: pip install pyserial")
     else:
-        print(f"❌ Cannot import enderscope-simple: {e}")
+        log.error("❌ Cannot import enderscope driver: %s", e)
     Stage = None
     SerialUtils = None
 except Exception as e:
-    print(f"❌ Error importing enderscope-simple: {e}")
+    log.error("❌ Error importing enderscope driver: %s", e)
     Stage = None
     SerialUtils = None
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Global stage instance
+# s without any reply from the firmware before a command fails
+ACK_TIMEOUT = 30.0
+# s a jog keeps going without a new /api/jog/start
+JOG_TIMEOUT = 1.0
+# s between progress records of /api/gcode/stream
+STREAM_PROGRESS_INTERVAL = 0.5
+
+# s between position history samples
+HISTORY_INTERVAL = 0.2
+# shared memory segment the position samples are published to, for local readers
+POSITION_SEGMENT = os.environ.get('ENDERSCOPE_POSITION_SEGMENT', 'enderscope-position')
+# local socket the serial consoles attach to (terminal-serie.py --server)
+CONSOLE_ADDRESS = os.environ.get('ENDERSCOPE_CONSOLE', CONSOLE_DEFAULT)
+# directory of the run logs, one per connection, none kept if unset
+RUN_LOG_DIR = os.environ.get('ENDERSCOPE_RUN_LOG')
+# directory of the serial captures (capture.py), one per connection, none kept if unset
+CAPTURE_DIR = os.environ.get('ENDERSCOPE_CAPTURE')
+
+# Global stage instance, its link supervisor and position sampler
 stage = None
+supervisor = None
+sampler = None
+history = PositionHistory()
+publisher = None
+console = None
+
+HTTP_SECONDS = REGISTRY.histogram('enderscope_http_request_seconds',
+                                  'HTTP handler duration', ['endpoint', 'method'])
+HTTP_REQUESTS = REGISTRY.counter('enderscope_http_requests_total',
+                                 'HTTP requests handled', ['endpoint', 'status'])
+REGISTRY.gauge('enderscope_stage_connected', 'Whether a stage is connected').set_function(
+    lambda: 1 if stage and stage.connected else 0)
+
+def open_run_log(stage):
+    """Starts a run log of the connection in RUN_LOG_DIR"""
+    if not RUN_LOG_DIR:
+        return
+    os.makedirs(RUN_LOG_DIR, exist_ok=True)
+    filename = os.path.join(RUN_LOG_DIR, time.strftime('run-%Y%m%d-%H%M%S.enderlog'))
+    stage.run_log = RunLog(filename)
+    log.info("📼 Journal de la session: %s", filename)
+
+def position_publisher():
+    """The shared memory publisher, created by the first connection"""
+    global publisher
+    if publisher is None:
+        try:
+            publisher = PositionPublisher(POSITION_SEGMENT)
+            atexit.register(publisher.close)
+            log.info("📍 Position publiée en mémoire partagée: %s", POSITION_SEGMENT)
+        except OSError as e:
+            log.warning("⚠️  Mémoire partagée indisponible (%s), position servie par HTTP seulement", e)
+            publisher = False
+    return publisher or None
+
+def console_server():
+    """The console server, created by the first connection"""
+    global console
+    if console is None:
+        try:
+            console = ConsoleServer(CONSOLE_ADDRESS).start()
+            atexit.register(console.stop)
+            log.info("🖥️  Console série partagée sur %s", CONSOLE_ADDRESS)
+        except OSError as e:
+            log.warning("⚠️  Console série indisponible (%s)", e)
+            console = False
+    return console or None
+
+def close_run_log(stage):
+    if stage and stage.run_log:
+        stage.run_log.close()
+        stage.run_log = None
+SERIAL_QUEUE = REGISTRY.gauge('enderscope_serial_queue_bytes',
+                              'Bytes waiting in the serial buffers', ['direction'])
+SERIAL_QUEUE.labels(direction='in').set_function(lambda: stage.ser.in_waiting if stage and stage.ser else 0)
+SERIAL_QUEUE.labels(direction='out').set_function(lambda: stage.ser.out_waiting if stage and stage.ser else 0)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_start' in g:
+        HTTP_SECONDS.labels(endpoint=endpoint, method=request.method).observe(
+            time.perf_counter() - g.request_start)
+    HTTP_REQUESTS.labels(endpoint=endpoint, status=response.status_code).inc()
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics of the server and the serial link"""
+    return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
 
 @app.route('/api/ports', methods=['GET'])
 def get_ports():
     """Get available serial ports"""
     try:
         if SerialUtils:
-            ports = SerialUtils.serial_ports()
+            ports = SerialUtils.list_ports()
         else:
             # Fallback for testing
             ports = ['/dev/ttyUSB0', '/dev/ttyACM0', 'COM3', 'COM4']
@@ -61,20 +157,39 @@ def get_ports():
 @app.route('/api/connect', methods=['POST'])
 def connect():
     """Connect to Enderscope"""
-    global stage
+    global stage, supervisor, sampler
     
     try:
         data = request.get_json()
         port = data.get('port') if data else None
         baud_rate = data.get('baudRate', 115200) if data else 115200
+        dtr_reset = data.get('dtrReset', False) if data else False
         
         if not port:
             return jsonify({'success': False, 'error': 'Port required'})
         
         if Stage:
             try:
-                stage = Stage(port, baud_rate, homing=False)
-                return jsonify({'success': True, 'message': f'Connected to {port}'})
+                if supervisor:
+                    supervisor.stop()
+                if sampler:
+                    sampler.stop()
+                close_run_log(stage)
+                capture = None
+                if CAPTURE_DIR:
+                    os.makedirs(CAPTURE_DIR, exist_ok=True)
+                    capture = os.path.join(CAPTURE_DIR, time.strftime('session-%Y%m%d-%H%M%S.capture'))
+                # a serial port, or moonraker:<socket> for Klipper
+                stage = open_stage(port, baud_rate=baud_rate, homing=False, dtr_reset=dtr_reset,
+                                   ack_timeout=ACK_TIMEOUT, capture=capture)
+                open_run_log(stage)
+                supervisor = LinkSupervisor(stage).start()
+                sampler = PositionSampler(stage, history, HISTORY_INTERVAL, position_publisher()).start()
+                if console_server():
+                    console.attach(stage)
+                log.info("🔌 Connecté à %s (firmware %s)", port, stage.backend.name)
+                return jsonify({'success': True, 'message': f'Connected to {port}',
+                                'backend': stage.backend.name})
             except Exception as stage_error:
                 return jsonify({'success': False, 'error': f'Connection failed: {str(stage_error)}'})
         else:
@@ -89,11 +204,20 @@ def connect():
 @app.route('/api/disconnect', methods=['POST'])
 def disconnect():
     """Disconnect from Enderscope"""
-    global stage
+    global stage, supervisor, sampler
     
     try:
-        if stage and hasattr(stage, 'ser'):
-            stage.ser.close()
+        if supervisor:
+            supervisor.stop()
+        supervisor = None
+        if sampler:
+            sampler.stop()
+        sampler = None
+        if console:
+            console.detach()
+        if stage:
+            stage.close()
+        close_run_log(stage)
         stage = None
         
         return jsonify({'success': True, 'message': 'Disconnected'})
@@ -169,6 +293,45 @@ def move_relative():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/jog/start', methods=['POST'])
+def jog_start():
+    """Start or update a continuous jog along (dx, dy, dz)
+
+    The jog stops by itself after `timeout` s unless the client posts again,
+    so a lost client does not leave the stage running.
+    """
+    try:
+        data = request.get_json()
+        vector = (data.get('dx', 0), data.get('dy', 0), data.get('dz', 0))
+        speed = data.get('speed', 1200)
+        timeout = data.get('timeout', JOG_TIMEOUT)
+        
+        if stage:
+            stage.start_jog(vector, speed, timeout=timeout)
+            return jsonify({'success': True, 'message': f'Jogging along {vector} at {speed} mm/min'})
+        else:
+            return jsonify({'success': True, 'message': f'Jogging along {vector} at {speed} mm/min (simulation)'})
+            
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/jog/stop', methods=['POST'])
+def jog_stop():
+    """Stop the jog (M410) and return the re-read position"""
+    try:
+        if stage:
+            position = stage.stop_jog()
+            if position:
+                position = {'x': position['X'], 'y': position['Y'], 'z': position['Z']}
+            if stage.jog_error:
+                return jsonify({'success': False, 'position': position, 'error': stage.jog_error})
+            return jsonify({'success': True, 'position': position})
+        else:
+            return jsonify({'success': True, 'position': None, 'message': 'Jog stopped (simulation)'})
+            
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/gcode', methods=['POST'])
 def send_gcode():
     """Send raw G-code command"""
@@ -180,28 +343,87 @@ def send_gcode():
             return jsonify({'success': False, 'error': 'No command provided'})
         
         if stage:
-            print(f"🔧 [GCODE] Envoi commande: {command}")
+            log.debug("🔧 [GCODE] Envoi commande: %s", command)
             stage.send_gcode(command)
             return jsonify({'success': True, 'message': f'G-code sent: {command}'})
         else:
-            print(f"🔧 [SIMULATION] G-code: {command}")
+            log.debug("🔧 [SIMULATION] G-code: %s", command)
             return jsonify({'success': True, 'message': f'G-code sent (simulation): {command}'})
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/gcode/stream', methods=['POST'])
+def stream_gcode():
+    """Run a G-code program sent as the request body, one command per line
+
+    The body is read line by line while the firmware acknowledges, so memory
+    does not grow with the program. The reply is NDJSON: a progress record
+    every STREAM_PROGRESS_INTERVAL s, then a final record with success.
+    The program stops after the lines in flight when the client goes away.
+    ?window= is passed to stage.stream: lines awaiting their ok on Marlin,
+    lines per script on Klipper, ignored by GRBL which counts characters.
+    Without it each backend uses its own default (4, Klipper 50).
+    """
+    body = request.stream
+    window = request.args.get('window', type=int)
+
+    if not stage:
+        count = sum(1 for _ in clean_lines(body))
+        log.debug("🔧 [SIMULATION] Programme G-code: %d lignes", count)
+        return jsonify({'success': True, 'lines': count, 'message': 'Program run (simulation)'})
+
+    # never blocks: stage.stream holds stage.lock while it reports
+    records = queue.SimpleQueue()
+    cancelled = threading.Event()
+    last = [0.0]
+
+    def report(sent, acked):
+        now = time.monotonic()
+        if now - last[0] >= STREAM_PROGRESS_INTERVAL and not cancelled.is_set():
+            last[0] = now
+            records.put({'sent': sent, 'acked': acked})
+
+    def lines():
+        for line in clean_lines(body):
+            if cancelled.is_set():
+                log.warning("⚠️  [GCODE] Client parti, programme arrêté")
+                return
+            yield line
+
+    def run():
+        try:
+            acked = stage.stream(lines(), window=window, progress=report)
+            records.put({'success': True, 'lines': acked})
+        except Exception as e:
+            log.error("❌ [GCODE] Programme interrompu: %s", e)
+            records.put({'success': False, 'error': str(e)})
+
+    def generate():
+        log.info("🔧 [GCODE] Exécution d'un programme en flux")
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            while True:
+                record = records.get()
+                yield json.dumps(record) + '\n'
+                if 'success' in record:
+                    break
+        finally:
+            # closed early when the client disconnects
+            cancelled.set()
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/emergency_stop', methods=['POST'])
 def emergency_stop():
     """Emergency stop - send M112 (emergency stop) and M999 (reset)"""
     try:
         if stage:
-            print(f"🛑 [EMERGENCY] Arrêt d'urgence activé!")
-            stage.send_gcode("M112")  # Emergency stop
-            time.sleep(0.1)
-            stage.send_gcode("M999")  # Reset after emergency stop
+            log.warning("🛑 [EMERGENCY] Arrêt d'urgence activé!")
+            stage.emergency_stop()  # M112 hors file d'attente, puis M999
             return jsonify({'success': True, 'message': 'Emergency stop executed'})
         else:
-            print(f"🛑 [SIMULATION] Arrêt d'urgence")
+            log.warning("🛑 [SIMULATION] Arrêt d'urgence")
             return jsonify({'success': True, 'message': 'Emergency stop (simulation)'})
             
     except Exception as e:
@@ -212,11 +434,11 @@ def beep():
     """Send M300 beep command"""
     try:
         if stage:
-            print(f"🔊 [BEEP] Bip!")
+            log.debug("🔊 [BEEP] Bip!")
             stage.send_gcode("M300")
             return jsonify({'success': True, 'message': 'Beep sent'})
         else:
-            print(f"🔊 [SIMULATION] Bip!")
+            log.debug("🔊 [SIMULATION] Bip!")
             return jsonify({'success': True, 'message': 'Beep sent (simulation)'})
             
     except Exception as e:
@@ -225,25 +447,44 @@ def beep():
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Get server status"""
-    connected = False
-    if stage and hasattr(stage, 'ser') and stage.ser and stage.ser.is_open:
-        connected = True
+    connected = bool(stage and stage.connected)
     
     return jsonify({
         'success': True,
         'connected': connected,
+        'link': supervisor.status() if supervisor else None,
         'simulation_mode': Stage is None,
         'port': stage.port if stage and hasattr(stage, 'port') else None,
+        'backend': {'name': stage.backend.name, 'capabilities': sorted(stage.backend.capabilities)} if stage else None,
         'message': 'Enderscope server running'
     })
 
+@app.route('/api/events', methods=['GET'])
+def get_events():
+    """Serial link events (lost, retry, reconnected) newer than ?since=<seq>"""
+    since = request.args.get('since', 0, type=int)
+    events = supervisor.events_since(since) if supervisor else []
+    return jsonify({'success': True, 'events': events})
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Position samples after ?since=<time>, downsampled to ?max_points= (method=minmax|lttb)"""
+    try:
+        since = request.args.get('since', type=float)
+        until = request.args.get('until', type=float)
+        max_points = request.args.get('max_points', 2000, type=int)
+        method = request.args.get('method', 'minmax')
+        return jsonify({'success': True, **history.query(since, until, max_points, method)})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 if __name__ == '__main__':
-    print("🔬 Starting Enderscope Hardware Server...")
-    print("📡 Server will run on http://localhost:5000")
+    log.info("🔬 Starting Enderscope Hardware Server...")
+    log.info("📡 Server will run on http://localhost:5000")
     
     if Stage is None:
-        print("⚠️  Running in SIMULATION mode (enderscope-simple.py not found)")
+        log.warning("⚠️  Running in SIMULATION mode (enderscope driver not available)")
     else:
-        print("✅ Hardware control enabled (enderscope-simple)")
+        log.info("✅ Hardware control enabled (enderscope driver)")
     
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
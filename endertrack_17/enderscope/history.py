@@ -0,0 +1,202 @@
+"""
+Position history of the stage, kept server side.
+
+PositionSampler records (t, x, y, z, state) samples into a preallocated NumPy
+ring buffer, PositionHistory.query() returns the samples of a time range
+downsampled to at most max_points, so a client can draw hours of track at any
+zoom without receiving every sample. Samples are ordered by time.monotonic(),
+a wall clock step cannot reorder or hide them; queries take and return
+time.time() values, converted with the clocks' current offset::
+
+    history = PositionHistory()
+    sampler = PositionSampler(stage, history).start()
+    history.query(since=time.time() - 3600, max_points=2000, method='lttb')
+"""
+import threading
+import time
+
+import numpy as np
+
+# state column
+STATIONARY, MOVING, LOST = 0, 1, 2
+FIELDS = ('t', 'x', 'y', 'z', 'state')
+
+
+class PositionHistory:
+    """
+    Ring buffer of the last capacity samples, oldest overwritten first
+    """
+
+    def __init__(self, capacity=1_000_000):
+        """
+        :param int capacity: samples kept, 40 bytes each
+        """
+        self.capacity = capacity
+        self._data = np.zeros((capacity, len(FIELDS)))
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, t, x, y, z, state=STATIONARY):
+        """
+        :param float t: time.monotonic() of the sample
+        """
+        with self._lock:
+            self._data[self._head] = (t, x, y, z, state)
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def samples(self, since=None, until=None):
+        """
+        :param float since: time.monotonic(), like until
+        :return: (n, 5) array copy of the samples with since < t <= until, in time order
+        """
+        with self._lock:
+            if self._count < self.capacity:
+                segments = [self._data[:self._count]]
+            else:
+                segments = [self._data[self._head:], self._data[:self._head]]
+            parts = []
+            for segment in segments:
+                t = segment[:, 0]
+                lo = 0 if since is None else np.searchsorted(t, since, side='right')
+                hi = len(t) if until is None else np.searchsorted(t, until, side='right')
+                parts.append(segment[lo:hi])
+            return np.concatenate(parts) if len(parts) > 1 else parts[0].copy()
+
+    def query(self, since=None, until=None, max_points=None, method='minmax'):
+        """
+        :param float since: only samples after this time.time()
+        :param float until: only samples up to this time.time()
+        :param int max_points: downsample to at most this many samples
+        :param str method: 'minmax' keeps the extreme x and y of each bucket,
+            'lttb' keeps the points shaping the track (largest triangle three buckets)
+        :return: dict of lists t (time.time()), x, y, z, state, plus count, the samples in the range
+        :raises ValueError: on an unknown method
+        """
+        if method not in DOWNSAMPLERS:
+            raise ValueError(f"unknown downsampling method {method!r}, expected 'minmax' or 'lttb'")
+        offset = time.time() - time.monotonic()
+        data = self.samples(None if since is None else since - offset,
+                            None if until is None else until - offset)
+        count = len(data)
+        if max_points and count > max_points:
+            data = data[DOWNSAMPLERS[method](data, max_points)]
+        result = {name: data[:, i].tolist() for i, name in enumerate(FIELDS)}
+        result['t'] = (data[:, 0] + offset).tolist()
+        result['state'] = [int(s) for s in result['state']]
+        result['count'] = count
+        return result
+
+
+def minmax_indices(data, max_points):
+    """
+    Splits the samples in (max_points - 2) // 4 buckets and keeps, in each,
+    the samples with the smallest and largest x and y, plus the first and
+    last samples
+    :return: sorted indices into data, max_points at most
+    """
+    n = len(data)
+    buckets = max(1, (max_points - 2) // 4)
+    size = -(-n // buckets)
+    padded = np.concatenate((data[:, 1:3], np.repeat(data[-1:, 1:3], buckets * size - n, axis=0)))
+    blocks = padded.reshape(buckets, size, 2)
+    offsets = (np.arange(buckets) * size)[:, None]
+    picks = np.concatenate((blocks.argmin(axis=1) + offsets, blocks.argmax(axis=1) + offsets), axis=1)
+    picks = np.unique(np.minimum(picks.ravel(), n - 1))
+    picks = np.union1d(picks, [0, n - 1])
+    if len(picks) > max_points:
+        # fewer than 6 points leave no room for a whole bucket
+        picks = picks[np.linspace(0, len(picks) - 1, max_points).round().astype(int)]
+    return picks
+
+
+def lttb_indices(data, max_points):
+    """
+    Largest triangle three buckets on (t, x, y, z): keeps the first and last
+    samples and, in each bucket between, the sample forming the largest
+    triangle with the previous pick and the mean of the next bucket
+    :return: sorted indices into data
+    """
+    n = len(data)
+    if max_points < 3 or n <= max_points:
+        return np.arange(n)
+    t = data[:, 0] - data[0, 0]
+    span = t[-1] or 1.0
+    points = np.column_stack((t / span, data[:, 1:4]))
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    picks = np.empty(max_points, dtype=int)
+    picks[0] = 0
+    picks[-1] = n - 1
+    previous = points[0]
+    for i in range(max_points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        following = points[hi:edges[i + 2]] if i + 2 < len(edges) else points[-1:]
+        target = following.mean(axis=0) if len(following) else points[-1]
+        candidates = points[lo:hi]
+        # area in each (t, axis) plane, summed over the axes
+        dt = target[0] - previous[0]
+        areas = np.abs(dt * (candidates[:, 1:] - previous[1:])
+                       - (candidates[:, :1] - previous[0]) * (target[1:] - previous[1:])).sum(axis=1)
+        best = lo + int(areas.argmax())
+        picks[i + 1] = best
+        previous = points[best]
+    return picks
+
+
+DOWNSAMPLERS = {'minmax': minmax_indices, 'lttb': lttb_indices}
+
+
+class PositionSampler:
+    """
+    Samples the stage position into a PositionHistory at a fixed interval
+    """
+
+    def __init__(self, stage, history, interval=0.2, publisher=None):
+        """
+        :param stage: a connected Stage
+        :param float interval: s between samples
+        :param publisher: livepos.PositionPublisher the samples are also published to
+        """
+        self.stage = stage
+        self.history = history
+        self.interval = interval
+        self.publisher = publisher
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        last = None
+        while not self._stop.wait(self.interval):
+            stage = self.stage
+            if not stage.connected:
+                position, state = stage.position, LOST
+            elif stage.lock.acquire(blocking=False):
+                try:
+                    position = stage.get_position(dict=True)
+                except Exception:
+                    position = None
+                finally:
+                    stage.lock.release()
+                state = MOVING if position != last else STATIONARY
+            else:
+                # never queue behind a command, the next sample catches up
+                continue
+            if not position:
+                continue
+            self.history.append(time.monotonic(), position['X'], position['Y'], position['Z'], state)
+            if self.publisher:
+                self.publisher.publish(position['X'], position['Y'], position['Z'], state)
+            last = position
@@ -0,0 +1,135 @@
+"""
+Latest stage position in shared memory, for acquisition processes on the same host.
+
+The server publishes each position sample into a small named segment guarded
+by a seqlock: the writer makes the sequence number odd, writes the fields and
+makes it even again, a reader retries until it read the same even number
+before and after the fields. Reading takes microseconds, never blocks the
+writer and never touches the serial port::
+
+    reader = PositionReader()
+    sample = reader.read()
+    sample.x, sample.y, sample.z, sample.state == MOVING
+
+    sample = reader.wait(sample.seq)  # blocks until the next sample
+"""
+import collections
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+from history import STATIONARY, MOVING, LOST  # noqa: F401, readers compare state to these
+
+NAME = 'enderscope-position'
+SEQ = struct.Struct('<Q')
+FIELDS = struct.Struct('<4dB')  # t, x, y, z, state
+SIZE = SEQ.size + FIELDS.size
+
+LivePosition = collections.namedtuple('LivePosition', 'seq t x y z state')
+
+
+def _attach(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    segment = shared_memory.SharedMemory(name)
+    # before 3.13 the resource tracker of an attaching process unlinks the
+    # segment when that process exits, under the publisher's feet
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+class PositionPublisher:
+    """
+    Single writer of the position segment
+    """
+
+    def __init__(self, name=NAME):
+        """
+        :param str name: segment name, the one readers attach to
+        """
+        try:
+            self._segment = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        except FileExistsError:
+            # left over by a server that did not exit cleanly
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self._segment = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        self.name = name
+        self._buffer = self._segment.buf
+        self._seq = 0
+        SEQ.pack_into(self._buffer, 0, 0)
+
+    def publish(self, x, y, z, state=STATIONARY, t=None):
+        """
+        :param int state: STATIONARY, MOVING or LOST
+        :param float t: time.time() of the sample, defaults to now
+        """
+        buffer = self._buffer
+        self._seq += 1
+        SEQ.pack_into(buffer, 0, self._seq)
+        FIELDS.pack_into(buffer, SEQ.size, time.time() if t is None else t, x, y, z, state)
+        self._seq += 1
+        SEQ.pack_into(buffer, 0, self._seq)
+
+    def close(self):
+        """
+        Removes the segment, readers still attached keep the last sample
+        """
+        self._buffer = None
+        self._segment.close()
+        self._segment.unlink()
+
+
+class PositionReader:
+    """
+    Reader of the position segment, any number of them in any process
+    """
+
+    def __init__(self, name=NAME):
+        """
+        :raises FileNotFoundError: if no server publishes under name
+        """
+        self._segment = _attach(name)
+        self._buffer = self._segment.buf
+
+    def read(self):
+        """
+        :return: LivePosition, seq is 0 and the fields are 0 until the first sample
+        """
+        buffer = self._buffer
+        while True:
+            before, = SEQ.unpack_from(buffer, 0)
+            if before & 1:
+                continue
+            fields = FIELDS.unpack_from(buffer, SEQ.size)
+            after, = SEQ.unpack_from(buffer, 0)
+            if before == after:
+                return LivePosition(before // 2, *fields)
+
+    def wait(self, seq, timeout=None, interval=0.001):
+        """
+        Polls until a sample newer than seq is published
+        :param float interval: s between polls
+        :return: LivePosition, None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sample = self.read()
+            if sample.seq > seq:
+                return sample
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+
+    def close(self):
+        self._buffer = None
+        self._segment.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
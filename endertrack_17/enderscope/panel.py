@@ -0,0 +1,197 @@
+"""
+Jupyter control panel for a Stage.
+
+ipywidgets and IPython are only imported when a Panel is created. Clicks are
+queued to a background worker so the kernel stays responsive during moves,
+and a sampler refreshes the position label while the stage is idle.
+"""
+import json
+import queue
+import threading
+
+
+class Panel():
+    def create_button(self, description, bcolor):
+        from ipywidgets import Button, Layout
+        b = Button(description=description, style=dict(button_color=bcolor), layout=Layout(height='auto', width='auto'))
+        b.on_click(self.on_button_clicked)
+        return b
+
+    def set_steps(self, xys,zs):
+        self.xys = xys
+        self.zs = zs
+
+    def checkbox_changed(self,element):
+        if element['new'] == True:
+            self.recording = True
+            element['owner'].description = 'Recording...'
+        else:
+            self.recording = False
+            element['owner'].description = 'Record'
+
+    def submit(self, description, action):
+        """
+        Queues an action for the motion worker
+        :param str description: shown while the action runs
+        :param action: callable using the stage, followed by finish_moves
+        """
+        self.actions.put((description, action))
+        self.update_status()
+
+    def cancel_queued(self):
+        """
+        Drops the queued actions, the one in progress completes
+        """
+        while True:
+            try:
+                self.actions.get_nowait()
+            except queue.Empty:
+                break
+        self.update_status()
+
+    def update_status(self):
+        pending = self.actions.qsize()
+        text = f"⏳ {self.busy}" if self.busy else "idle"
+        if pending:
+            text += f" ({pending} queued)"
+        self.status.value = text
+
+    def show(self, message):
+        with self.output:
+            self.output.clear_output()
+            print (message)
+
+    def _work(self):
+        while True:
+            description, action = self.actions.get()
+            if action is None:
+                break
+            self.busy = description
+            self.update_status()
+            try:
+                action()
+                self.s.finish_moves()
+            except Exception as e:
+                self.show(f"{description} failed: {e}")
+            self.busy = None
+            self.update_status()
+
+    def _sample(self):
+        last = None
+        while not self._closed.wait(self.sample_interval):
+            # never wait behind a move, the label refreshes once it completes
+            if not self.s.lock.acquire(blocking=False):
+                continue
+            try:
+                position = self.s.get_position(dict=True)
+            except Exception:
+                position = None
+            finally:
+                self.s.lock.release()
+            if position and position != last:
+                last = position
+                self.position_label.value = 'X: {X:.2f}  Y: {Y:.2f}  Z: {Z:.2f}'.format(**position)
+
+    def record_position(self, m):
+        self.recorded_positions[m] = self.s.get_position()
+        self.slot_buttons[m].style.button_color="#ffd6b9"
+
+    def save_positions(self):
+        """
+        Writes the recorded positions to positions_file
+        """
+        with open(self.positions_file, 'w') as f:
+            json.dump(self.recorded_positions, f)
+        self.show(f"positions saved to {self.positions_file}")
+
+    def open_positions(self):
+        """
+        Loads the recorded positions from positions_file
+        """
+        try:
+            with open(self.positions_file) as f:
+                positions = json.load(f)
+        except (OSError, ValueError) as e:
+            self.show(f"cannot open {self.positions_file}: {e}")
+            return
+        for m, b in enumerate(self.slot_buttons):
+            p = positions[m] if m < len(positions) else None
+            self.recorded_positions[m] = tuple(p) if p is not None else None
+            b.style.button_color = "#ffd6b9" if p is not None else 'lightgrey'
+        self.show(f"positions loaded from {self.positions_file}")
+
+    def on_button_clicked(self, b):
+        if b.description == 'Home':
+            self.submit('homing', self.s.home)
+        elif b.description == 'Cancel':
+            self.cancel_queued()
+        elif b.description == 'Save':
+            self.save_positions()
+        elif b.description == 'Open':
+            self.open_positions()
+        elif b.description.startswith('P'):
+            m = int(b.description[-1])-1
+            if self.recording == True:
+                self.submit(f'recording {b.description}', lambda: self.record_position(m))
+            elif self.recorded_positions[m] is not None:
+                p = self.recorded_positions[m]
+                self.submit(f'moving to {b.description}', lambda: self.s.move_position(p))
+        else:
+            direction = b.description
+            self.submit(f'moving {direction.lower()}', lambda: self.s.move_towards(direction,5))
+
+    def close(self):
+        """
+        Stops the worker once the queued actions are done, and the sampler
+        """
+        self._closed.set()
+        self.actions.put((None, None))
+
+    def __init__(self, s, positions_file='panel-positions.json', sample_interval=0.5):
+        """
+        :param s: a connected Stage
+        :param str positions_file: where Save and Open keep the six recorded positions
+        :param float sample_interval: s between position label refreshes
+        """
+        from ipywidgets import widgets, Layout, GridspecLayout, Output
+        from IPython.display import display
+        self.recording = False
+        self.recorded_positions = [None for i in range(6)]
+        self.s = s
+        self.positions_file = positions_file
+        self.sample_interval = sample_interval
+        self.actions = queue.Queue()
+        self.busy = None
+        self._closed = threading.Event()
+        grid = GridspecLayout(5, 12, height='auto', width='auto')
+        grid[0:2, 0] = self.create_button('Up', 'paleturquoise')
+        grid[2:, 0] = self.create_button('Down', 'paleturquoise')
+        grid[0, 1:3] = self.create_button('North', 'palegreen')
+        grid[2, 1:3] = self.create_button('South', 'palegreen')
+        grid[1, 1] = self.create_button('West', 'palegreen')
+        grid[1, 2] = self.create_button('East', 'palegreen')
+        grid[3:, 1:3] = self.create_button('Home', 'lightyellow')
+        record_cb = widgets.Checkbox(value=False, description='Record', indent=False, layout=Layout(width='100px'))
+        record_cb.observe(self.checkbox_changed, names='value')
+        grid[0, 3:5] = record_cb
+        self.slot_buttons = [self.create_button(f'P{i + 1}', 'lightgrey') for i in range(6)]
+        grid[1,3] = self.slot_buttons[0]
+        grid[1,4] = self.slot_buttons[1]
+        grid[2,3] = self.slot_buttons[2]
+        grid[2,4] = self.slot_buttons[3]
+        grid[3,3] = self.slot_buttons[4]
+        grid[3,4] = self.slot_buttons[5]
+        grid[4,3] = self.create_button('Save', 'pink')
+        grid[4,4] = self.create_button('Open', 'pink')
+        self.position_label = widgets.Label(value='X: -  Y: -  Z: -')
+        self.status = widgets.Label(value='idle')
+        grid[0, 5:9] = self.position_label
+        grid[1, 5:9] = self.status
+        grid[2, 5:7] = self.create_button('Cancel', 'mistyrose')
+        self.xys = 5
+        self.zs = 1
+        self.grid = grid
+        self.output = Output()
+        threading.Thread(target=self._work, daemon=True).start()
+        threading.Thread(target=self._sample, daemon=True).start()
+        display (grid, self.output)
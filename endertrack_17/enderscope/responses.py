@@ -0,0 +1,142 @@
+"""
+Framing and parsing of Marlin replies at the bytes level.
+
+Replies are accumulated in a bytearray and each line is matched in place by
+precompiled bytes patterns, between its start and end offsets: no line is
+copied nor decoded to str unless it has to be kept as text (errors, echo).
+Each line becomes a typed result::
+
+    parser = ResponseParser()
+    for reply in parser.feed(ser.read(ser.in_waiting or 1)):
+        if isinstance(reply, Position):
+            reply.x, reply.y, reply.z
+
+Lines nobody has a pattern for come back as Other(text).
+"""
+import collections
+import re
+
+Ok = collections.namedtuple('Ok', 'line_number')
+Position = collections.namedtuple('Position', 'x y z e')
+Temperature = collections.namedtuple('Temperature', 'hotend hotend_target bed bed_target')
+Resend = collections.namedtuple('Resend', 'line_number')
+Error = collections.namedtuple('Error', 'message')
+Busy = collections.namedtuple('Busy', 'reason')
+Echo = collections.namedtuple('Echo', 'text')
+Other = collections.namedtuple('Other', 'text')
+
+# loose on purpose, float() rejects the odd malformed number
+NUMBER = rb'([-0-9.]+)'
+POSITION = re.compile(rb'X:' + NUMBER + rb' Y:' + NUMBER + rb' Z:' + NUMBER + rb'(?: E:' + NUMBER + rb')?')
+TEMPERATURE = re.compile(rb'T:' + NUMBER + rb' /' + NUMBER + rb'(?:.*?B:' + NUMBER + rb' /' + NUMBER + rb')?')
+OK = re.compile(rb'ok(?: N(\d+))?')
+RESEND = re.compile(rb'(?:Resend:|rs) ?N?(\d+)')
+
+
+OK_PLAIN = Ok(None)
+
+
+def parse_line(line):
+    """
+    :param line: one reply line without its terminator, bytes, bytearray or memoryview
+    :return: Ok, Position, Temperature, Resend, Error, Busy, Echo or Other
+    """
+    return _parse(line, 0, len(line))
+
+
+def _parse(buffer, start, stop):
+    """
+    Parses buffer[start:stop] in place, the patterns match between pos and
+    endpos so the line is never copied unless it is kept as text
+    """
+    length = stop - start
+    if not length:
+        return Other('')
+    first = buffer[start]
+    if first == 0x6f:  # o
+        if length == 2 and buffer[start + 1] == 0x6b:
+            return OK_PLAIN
+        match = OK.match(buffer, start, stop)
+        if match:
+            temperature = TEMPERATURE.search(buffer, start, stop)
+            if temperature:
+                return _temperature(temperature) or Other(_text(buffer, start, stop))
+            number = match.group(1)
+            return Ok(int(number) if number else None)
+    elif first == 0x58:  # X
+        match = POSITION.match(buffer, start, stop)
+        if match:
+            x, y, z, e = match.groups()
+            try:
+                return Position(float(x), float(y), float(z), float(e) if e is not None else None)
+            except ValueError:
+                pass
+    elif first == 0x54 or first == 0x20:  # T, auto-reported temperatures start with a space
+        match = TEMPERATURE.search(buffer, start, stop)
+        if match:
+            return _temperature(match) or Other(_text(buffer, start, stop))
+    elif first == 0x52 or first == 0x72:  # R, r
+        match = RESEND.match(buffer, start, stop)
+        if match:
+            return Resend(int(match.group(1)))
+    elif first == 0x45 or first == 0x21:  # E, !
+        if buffer[start:start + 6] == b'Error:':
+            return Error(_text(buffer, start + 6, stop).strip())
+        if buffer[start:start + 2] == b'!!':
+            return Error(_text(buffer, start + 2, stop).strip())
+    elif first == 0x65:  # e
+        if buffer[start:start + 10] == b'echo:busy:':
+            return Busy(_text(buffer, start + 10, stop).strip())
+        if buffer[start:start + 5] == b'echo:':
+            return Echo(_text(buffer, start + 5, stop))
+    return Other(_text(buffer, start, stop))
+
+
+def _text(buffer, start, stop):
+    return bytes(buffer[start:stop]).decode('utf-8', errors='replace')
+
+
+def _temperature(match):
+    try:
+        return Temperature(*[float(v) if v is not None else None for v in match.groups()])
+    except ValueError:
+        return None
+
+
+class ResponseParser:
+    """
+    Incremental parser of a reply byte stream
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Appends received bytes and parses the complete lines
+        :return: list of results, the trailing partial line is kept for the next call
+        """
+        buffer = self._buffer
+        buffer += data
+        results = []
+        append = results.append
+        find = buffer.find
+        start = 0
+        end = find(b'\n')
+        while end >= 0:
+            stop = end
+            if stop > start and buffer[stop - 1] == 0x0d:  # \r
+                stop -= 1
+            if stop > start:
+                append(_parse(buffer, start, stop))
+            start = end + 1
+            end = find(b'\n', start)
+        if start:
+            del buffer[:start]
+        return results
+
+    def pending(self):
+        """
+        :return: number of bytes of the incomplete last line
+        """
+        return len(self._buffer)
@@ -0,0 +1,122 @@
+"""
+Append-only binary log of a run: commands, acknowledgements, positions.
+
+Every event is a fixed 48 byte record stamped with time.monotonic(). The
+serial path only puts a tuple on a queue, a background thread packs the
+records with NumPy and appends them to the file. Readers memory-map the file
+as a structured array, so a run of millions of events opens instantly::
+
+    stage.run_log = RunLog('scan-12.enderlog')
+    ...
+    log = read_run_log('scan-12.enderlog')
+    acks = log[log['kind'] == ACK]
+    acks['latency'].mean(), acks['text'][acks['latency'].argmax()]
+"""
+import math
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b'ENDERLOG'
+VERSION = 1
+HEADER = struct.Struct('<8sII')  # magic, version, record size
+
+# kind column
+COMMAND, ACK, POSITION, ERROR = 1, 2, 3, 4
+
+RECORD = np.dtype([
+    ('t', '<f8'),         # time.monotonic() of the event
+    ('x', '<f4'),         # position events
+    ('y', '<f4'),
+    ('z', '<f4'),
+    ('latency', '<f4'),   # ack events: s from write to ok
+    ('kind', 'u1'),
+    ('text', 'S23'),      # command or error, truncated
+])
+
+
+class RunLog:
+    """
+    Writer of a run log, safe to call from any thread without blocking on I/O
+    """
+
+    def __init__(self, filename, batch=4096):
+        """
+        :param str filename: created, or appended to if it is a run log already
+        :param int batch: records written at once at most
+        """
+        self.filename = filename
+        self.batch = batch
+        self._queue = queue.SimpleQueue()
+        self._file = open(filename, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize))
+            self._file.flush()
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def record(self, kind, text='', x=math.nan, y=math.nan, z=math.nan, latency=math.nan, t=None):
+        """
+        Queues an event, t defaults to now
+        """
+        self._queue.put((time.monotonic() if t is None else t, x, y, z, latency, kind, text))
+
+    def command(self, code):
+        self.record(COMMAND, code)
+
+    def ack(self, code, latency):
+        self.record(ACK, code, latency=latency)
+
+    def position(self, x, y, z):
+        self.record(POSITION, x=x, y=y, z=z)
+
+    def error(self, message):
+        self.record(ERROR, message)
+
+    def _write(self):
+        while True:
+            records = [self._queue.get()]
+            while len(records) < self.batch:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = records[-1] is None
+            if closing:
+                records.pop()
+            if records:
+                # text is encoded here rather than on the caller's thread
+                records = [r[:6] + (r[6].encode('utf-8', errors='replace')[:23],) for r in records]
+                self._file.write(np.array(records, dtype=RECORD).tobytes())
+                self._file.flush()
+            if closing:
+                break
+
+    def close(self):
+        """
+        Writes the queued events and closes the file
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+def read_run_log(filename):
+    """
+    Maps a run log read-only, a record being written is left out
+    :return: numpy structured array (memmap) with the RECORD fields
+    :raises ValueError: if filename is not a run log of this version
+    """
+    with open(filename, 'rb') as f:
+        magic, version, size = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0, 2)
+        length = f.tell()
+    if magic != MAGIC or version != VERSION or size != RECORD.itemsize:
+        raise ValueError(f"{filename} is not a version {VERSION} run log")
+    count = (length - HEADER.size) // RECORD.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(filename, dtype=RECORD, mode='r', offset=HEADER.size, shape=(count,))
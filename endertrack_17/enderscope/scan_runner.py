@@ -0,0 +1,223 @@
+"""
+Resumable execution of scan paths on a Stage.
+
+Every point whose move has been confirmed is appended to a journal file, so a
+run interrupted by a serial hiccup, a server restart or an emergency stop
+picks up after the last confirmed point instead of starting over. A run
+resumed from an existing journal first checks with M114 that the stage is
+still at the last confirmed point (or rehomes with rehome='always') and
+refuses to go on otherwise::
+
+    path = ScanPatterns.snake(20, 20) * 2
+    runner = ScanRunner(stage, path, 'slide-12.journal', on_point=acquire)
+    runner.run()
+    runner.stats()
+"""
+import hashlib
+import json
+import os
+import time
+
+import serial
+
+
+class ScanJournal:
+    """
+    Append-only record of the completed points of a path
+    The first line identifies the path so a journal is never replayed
+    against a different scan.
+    """
+
+    def __init__(self, filename, path, fsync=True):
+        self.filename = filename
+        self.fsync = fsync
+        self.fingerprint = self.path_fingerprint(path)
+        self.entries = {}
+        if os.path.exists(filename):
+            self._load()
+        self._file = open(filename, 'a')
+        if os.path.getsize(filename) == 0:
+            self._write({'path': self.fingerprint, 'points': len(path)})
+
+    @staticmethod
+    def path_fingerprint(path):
+        text = ';'.join(','.join(f'{float(c):.6f}' for c in p) for p in path)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _load(self):
+        with open(self.filename) as f:
+            lines = f.readlines()
+        if not lines:
+            return
+        header = json.loads(lines[0])
+        if header.get('path') != self.fingerprint:
+            raise ValueError(f'{self.filename} journals a different scan path')
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # torn last line after a crash
+                continue
+            self.entries[entry['i']] = entry
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def append(self, index, position, settle):
+        entry = {'i': int(index), 'p': [float(c) for c in position],
+                 't': time.time(), 'settle': settle}
+        self._write(entry)
+        self.entries[entry['i']] = entry
+
+    def completed(self):
+        return set(self.entries)
+
+    def last(self):
+        """
+        :return: the most recently journaled entry, None for a fresh run
+        """
+        if not self.entries:
+            return None
+        return max(self.entries.values(), key=lambda e: e['t'])
+
+    def close(self):
+        self._file.close()
+
+
+class ScanRunner:
+    """
+    Moves a stage through a path, journaling each confirmed point
+    """
+
+    def __init__(self, stage, path, journal, on_point=None, rehome='auto',
+                 tolerance=0.05, max_retries=5, retry_delay=1.0):
+        """
+        :param stage: a connected Stage
+        :param path: sequence of (x, y) or (x, y, z) positions, e.g. from ScanPatterns
+        :param journal: journal file name, reused to resume the run
+        :param on_point: called as on_point(index, position) once the stage has settled
+        :param str rehome: 'auto' homes after a reconnect when the reported
+            position no longer matches the last confirmed one, 'always' or 'never';
+            'always' also homes before resuming a journal
+        :param float tolerance: position mismatch in mm that triggers rehoming,
+            or stops a resumed run
+        :param int max_retries: reconnection attempts for a single point
+        :param float retry_delay: first wait between attempts in s, doubled each time
+        """
+        self.stage = stage
+        self.path = path
+        self.journal = ScanJournal(journal, path)
+        self.on_point = on_point
+        self.rehome = rehome
+        self.tolerance = tolerance
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.settle_times = []
+        self.started = None
+        self.elapsed = 0.0
+        # points journaled by an earlier process, the stage may have moved since
+        self._resuming = bool(self.journal.entries)
+
+    def pending(self):
+        done = self.journal.completed()
+        return [i for i in range(len(self.path)) if i not in done]
+
+    def run(self):
+        """
+        Executes the points not yet in the journal
+        :return: throughput statistics, see stats()
+        :raises RuntimeError: resuming a journal while the stage is not at its last point
+        """
+        if self._resuming:
+            self._check_resume()
+            self._resuming = False
+        self.started = time.monotonic()
+        try:
+            for index in self.pending():
+                self._run_point(index)
+        finally:
+            self.elapsed += time.monotonic() - self.started
+            self.started = None
+        return self.stats()
+
+    def _run_point(self, index):
+        position = self.path[index]
+        attempt = 0
+        while True:
+            try:
+                t0 = time.monotonic()
+                self.stage.move_position(position)
+                self.stage.finish_moves()
+                settle = time.monotonic() - t0
+                break
+            except (serial.SerialException, OSError):
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                self.recover()
+        if self.on_point:
+            self.on_point(index, position)
+        self.journal.append(index, position, settle)
+        self.settle_times.append(settle)
+
+    def _check_resume(self):
+        """
+        Rehomes, or makes sure M114 reports the last journaled point or the
+        next one (moved to but not journaled when the run stopped)
+        """
+        if self.rehome == 'always':
+            self.stage.home()
+            self.stage.finish_moves()
+            return
+        last = self.journal.last()
+        expected = [last['p']] + [self.path[i] for i in self.pending()[:1]]
+        current = self.stage.get_position()
+        if current is None or not any(self._within(current, p) for p in expected):
+            raise RuntimeError(f"{self.journal.filename}: the stage is at {current}, not at the last "
+                               f"journaled point {last['p']}; home it or use rehome='always'")
+
+    def _within(self, current, position):
+        return all(abs(c - p) <= self.tolerance for c, p in zip(current, position))
+
+    def recover(self):
+        """
+        Reconnects the stage and rehomes it if its position was lost
+        """
+        try:
+            self.stage.reconnect()
+        except (serial.SerialException, OSError):
+            return
+        if self.rehome == 'never':
+            return
+        if self.rehome == 'always' or self._position_lost():
+            self.stage.home()
+            self.stage.finish_moves()
+
+    def _position_lost(self):
+        last = self.journal.last()
+        if last is None:
+            return False
+        current = self.stage.get_position()
+        return current is None or not self._within(current, last['p'])
+
+    def stats(self):
+        """
+        :return: dict with completed/total points, points per minute and mean settle time in s
+        """
+        elapsed = self.elapsed
+        if self.started is not None:
+            elapsed += time.monotonic() - self.started
+        done = len(self.settle_times)
+        return {
+            'completed': len(self.journal.completed()),
+            'total': len(self.path),
+            'points_per_min': 60.0 * done / elapsed if elapsed > 0 else 0.0,
+            'mean_settle': sum(self.settle_times) / done if done else 0.0,
+        }
+
+    def close(self):
+        self.journal.close()
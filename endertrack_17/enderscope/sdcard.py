@@ -0,0 +1,116 @@
+"""
+Running scan programs from the firmware's SD card.
+
+Host-streamed scans depend on USB latency and host scheduling. A program
+uploaded to the SD card (M28/M29) and started there (M23/M24) is timed by the
+board alone, the host only polls progress with M27::
+
+    program = SDProgram(stage, 'SCAN.GCO')
+    program.upload(compile_program(ScanPatterns.snake(20, 20) * 2, dwell=0.5))
+    program.start()
+    program.wait(callback=print)
+"""
+import re
+import time
+
+from driver import clean_lines
+
+PROGRESS = re.compile(r'SD printing byte (\d+)/(\d+)')
+
+
+def compile_program(path, feedrate=3000, dwell=0.0, z=None):
+    """
+    Turns a scan path into G-code lines
+    :param path: sequence of (x, y) or (x, y, z) positions, e.g. from ScanPatterns
+    :param float feedrate: mm/min
+    :param float dwell: pause at each point in s, e.g. for an exposure
+    :param float z: height for 2D paths, None keeps the current one
+    :return: generator of G-code lines
+    """
+    yield "G21"
+    yield "G90"
+    yield f"G0 F{feedrate}"
+    for point in path:
+        x, y = float(point[0]), float(point[1])
+        code = f"G0 X{x:.3f} Y{y:.3f}"
+        if len(point) > 2:
+            code += f" Z{float(point[2]):.3f}"
+        elif z is not None:
+            code += f" Z{z:.3f}"
+        yield code
+        if dwell:
+            yield "M400"
+            yield f"G4 P{int(dwell * 1000)}"
+    yield "M400"
+
+
+class SDProgram:
+    """
+    A G-code program stored on the firmware's SD card
+    """
+
+    def __init__(self, stage, filename='SCAN.GCO'):
+        """
+        :param stage: a connected Stage
+        :param str filename: 8.3 name on the card
+        """
+        self.stage = stage
+        self.filename = filename
+
+    def upload(self, lines, window=4, progress=None):
+        """
+        Writes the program to the card, streaming the lines with flow control
+        :param lines: iterable of G-code lines, comments and blank lines are dropped
+        :param progress: called as progress(sent, acked)
+        :return: number of lines written
+        """
+        self.stage.write_code("M110 N0")
+        self.stage.write_code(f"M28 {self.filename}")
+        try:
+            count = self.stage.stream(clean_lines(lines), window=window,
+                                      reset_line_numbers=False, progress=progress)
+        finally:
+            self.stage.write_code("M29")
+        return count
+
+    def start(self):
+        """
+        Selects the program and starts it on the board
+        """
+        self.stage.write_code(f"M23 {self.filename}")
+        self.stage.write_code("M24")
+
+    def pause(self):
+        self.stage.write_code("M25")
+
+    def resume(self):
+        self.stage.write_code("M24")
+
+    def abort(self):
+        self.stage.write_code("M524")
+
+    def progress(self):
+        """
+        :return: (bytes done, bytes total), None when the card is not printing
+        """
+        for line in self.stage.query("M27"):
+            match = PROGRESS.search(line)
+            if match:
+                return int(match.group(1)), int(match.group(2))
+        return None
+
+    def wait(self, poll=1.0, callback=None):
+        """
+        Polls M27 until the program has finished
+        :param float poll: s between polls
+        :param callback: called as callback(done, total) at each poll
+        """
+        while True:
+            progress = self.progress()
+            if progress is None:
+                return
+            if callback:
+                callback(*progress)
+            if progress[0] >= progress[1]:
+                return
+            time.sleep(poll)
@@ -0,0 +1,540 @@
+"""
+Stand-in devices to exercise the drivers without hardware.
+
+Each device opens a pseudo-terminal and answers on its master side the way the
+firmware would, so the drivers connect to ``device.port`` unchanged::
+
+    lights = VirtualEnderlights()
+    e = Enderlights(lights.port)
+    e.color(10, 20, 30)
+    lights.state, lights.received
+"""
+import json
+import os
+import queue
+import re
+import select
+import socket
+import threading
+import time
+import tty
+
+from capture import read_capture, TX, RX
+
+
+class VirtualDevice:
+    """
+    Line oriented firmware stand-in served on a pseudo-terminal
+    Subclasses implement handle(line) and return the reply lines. Bytes in
+    realtime are taken out of the input as soon as they arrive and passed to
+    handle_realtime(char).
+    """
+
+    realtime = b''
+
+    def __init__(self):
+        self.booted_at = time.monotonic()
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self.received = []
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def booted(self):
+        return True
+
+    def handle(self, line):
+        return ['ok']
+
+    def handle_realtime(self, char):
+        return []
+
+    def reply(self, line):
+        os.write(self._master, (line + '\n').encode('utf-8'))
+
+    def _serve(self):
+        buffer = b''
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                self.booted()
+                continue
+            try:
+                buffer += os.read(self._master, 4096)
+            except OSError:
+                break
+            for char in self.realtime:
+                count = buffer.count(bytes([char]))
+                if count:
+                    buffer = buffer.replace(bytes([char]), b'')
+                for _ in range(count):
+                    for response in self.handle_realtime(chr(char)):
+                        self.reply(response)
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                line = line.strip().decode('utf-8', errors='replace')
+                if not line:
+                    continue
+                if not self.booted():
+                    continue
+                self.received.append(line)
+                for response in self.handle(line):
+                    self.reply(response)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VirtualEnderlights(VirtualDevice):
+    """
+    Enderlights firmware following ENDERLIGHTS-PROTOCOL.md
+    """
+
+    CHANNELS = ('MA', 'S', 'M', 'P', 'R', 'G', 'B')
+
+    def __init__(self):
+        self.state = {'S': 0, 'M': 0, 'MA': 0, 'P': 0, 'R': 0, 'G': 0, 'B': 0}
+        super().__init__()
+
+    def handle(self, line):
+        updates = {}
+        for token in line.split():
+            channel = next((c for c in self.CHANNELS if token.startswith(c)), None)
+            try:
+                updates[channel] = int(token[len(channel):])
+            except (TypeError, ValueError):
+                return [f'error: bad token {token}']
+        self.state.update(updates)
+        return ['ok']
+
+
+class VirtualMarlin(VirtualDevice):
+    """
+    Marlin-like 3 axis stage
+    Moves are instantaneous. With boot_time the device ignores input for that
+    long after creation or reboot(), then prints its banner like a freshly
+    reset board. SD card files live in files, a running file executes one
+    line every sd_line_time s.
+    """
+
+    WORD = re.compile(r'([A-Z])\s*(-?[0-9.]+)')
+
+    def __init__(self, boot_time=0.0, sd_line_time=0.01):
+        self.boot_time = boot_time
+        self.sd_line_time = sd_line_time
+        self.files = {}
+        self._writing = None
+        self._sd_file = None
+        self._sd_index = 0
+        self._sd_running = False
+        self._sd_next = 0.0
+        self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
+        self.relative = False
+        self.feedrate = 3000.0
+        self.halted = False
+        self._banner_sent = boot_time == 0
+        super().__init__()
+
+    def reboot(self):
+        """
+        Simulates a reset: position and modal state are lost
+        """
+        self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
+        self.relative = False
+        self.halted = False
+        self._writing = None
+        self._sd_file = None
+        self._sd_running = False
+        self._banner_sent = False
+        self.booted_at = time.monotonic()
+
+    def booted(self):
+        if time.monotonic() - self.booted_at < self.boot_time:
+            return False
+        if not self._banner_sent:
+            self._banner_sent = True
+            self.reply('start')
+            self.reply('echo:Marlin stand-in')
+        return True
+
+    def position_report(self):
+        p = self.position
+        return (f"X:{p['X']:.2f} Y:{p['Y']:.2f} Z:{p['Z']:.2f} E:0.00 "
+                f"Count X:{round(p['X'] * 80)} Y:{round(p['Y'] * 80)} Z:{round(p['Z'] * 400)}")
+
+    def _advance_sd(self):
+        """
+        Executes the SD lines due since the last call
+        """
+        now = time.monotonic()
+        lines = self.files[self._sd_file]
+        while self._sd_running and self._sd_next <= now:
+            if self._sd_index >= len(lines):
+                self._sd_running = False
+                self._sd_file = None
+                break
+            self.execute(lines[self._sd_index])
+            self._sd_index += 1
+            self._sd_next += self.sd_line_time
+
+    def sd_report(self):
+        if self._sd_file is None:
+            return 'Not SD printing'
+        lines = self.files[self._sd_file]
+        done = sum(len(line) + 1 for line in lines[:self._sd_index])
+        total = sum(len(line) + 1 for line in lines)
+        return f'SD printing byte {done}/{total}'
+
+    def handle(self, line):
+        line = line.split(';', 1)[0].strip()
+        if line.startswith('N') and '*' in line:
+            # line number and checksum
+            line = line.split(' ', 1)[1].rsplit('*', 1)[0]
+        command = line.split(maxsplit=1)[0] if line else ''
+        argument = line[len(command):].strip()
+        if self._sd_running:
+            self._advance_sd()
+        if self.halted and command != 'M999':
+            return ['Error:Printer halted. kill() called!']
+        if self._writing is not None and command != 'M29':
+            if command != 'M110':
+                self.files[self._writing].append(line)
+            return ['ok']
+        if command == 'M28':
+            self._writing = argument
+            self.files[argument] = []
+            return [f'Writing to file: {argument}', 'ok']
+        elif command == 'M29':
+            self._writing = None
+            return ['Done saving file.', 'ok']
+        elif command == 'M23':
+            if argument not in self.files:
+                return [f'open failed, File: {argument}.', 'ok']
+            self._sd_file = argument
+            self._sd_index = 0
+            self._sd_running = False
+            size = sum(len(l) + 1 for l in self.files[argument])
+            return [f'File opened: {argument} Size: {size}', 'File selected', 'ok']
+        elif command == 'M24':
+            if self._sd_file is not None and not self._sd_running:
+                self._sd_running = True
+                self._sd_next = time.monotonic()
+        elif command == 'M25':
+            self._sd_running = False
+        elif command == 'M27':
+            return [self.sd_report(), 'ok']
+        elif command == 'M524':
+            self._sd_running = False
+            self._sd_file = None
+        else:
+            return self.execute(line)
+        return ['ok']
+
+    def execute(self, line):
+        """
+        Runs a motion or status command, sent by the host or read from a SD file
+        :return: reply lines
+        """
+        command = line.split(maxsplit=1)[0] if line else ''
+        words = dict(self.WORD.findall(line[len(command):].upper()))
+        if command in ('G0', 'G1'):
+            if 'F' in words:
+                self.feedrate = float(words['F'])
+            for axis in 'XYZ':
+                if axis in words:
+                    value = float(words[axis])
+                    self.position[axis] = self.position[axis] + value if self.relative else value
+        elif command == 'G28':
+            self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
+        elif command == 'G90':
+            self.relative = False
+        elif command == 'G91':
+            self.relative = True
+        elif command == 'M114':
+            return [self.position_report(), 'ok']
+        elif command == 'M115':
+            return ['FIRMWARE_NAME:Marlin stand-in SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin '
+                    'PROTOCOL_VERSION:1.0 MACHINE_TYPE:Enderscope EXTRUDER_COUNT:0', 'ok']
+        elif command == 'M112':
+            self.halted = True
+            return []
+        elif command == 'M999':
+            self.halted = False
+        return ['ok']
+
+
+class VirtualGrbl(VirtualDevice):
+    """
+    GRBL 1.1 like 3 axis stage
+    Answers ok or error:<code>, ? with a status report and 0x85 (jog cancel)
+    without a reply. M-codes other than the spindle and coolant ones are
+    rejected with error:20 like on the real firmware.
+    """
+
+    WORD = re.compile(r'([A-Z])\s*(-?[0-9.]+)')
+    realtime = b'?!~\x18\x85'
+
+    def __init__(self):
+        self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
+        self.relative = False
+        self.state = 'Idle'
+        super().__init__()
+
+    def handle_realtime(self, char):
+        if char == '?':
+            p = self.position
+            return [f"<{self.state}|MPos:{p['X']:.3f},{p['Y']:.3f},{p['Z']:.3f}|FS:0,0>"]
+        if char == '!':
+            self.state = 'Hold:0'
+        elif char == '~':
+            self.state = 'Idle'
+        elif char == '\x18':
+            self.state = 'Idle'
+            return ['', "Grbl 1.1h ['$' for help]"]
+        return []
+
+    def handle(self, line):
+        line = line.upper()
+        if line == '$I':
+            return ['[VER:1.1h.20190825:]', '[OPT:V,15,128]', 'ok']
+        if line == '$H':
+            self.position = {'X': 0.0, 'Y': 0.0, 'Z': 0.0}
+            return ['ok']
+        jog = line.startswith('$J=')
+        if jog:
+            line = line[3:]
+        elif line.startswith('$'):
+            return ['ok']
+        relative = self.relative
+        for command in re.findall(r'G\d+|M\d+', line):
+            if command == 'G90':
+                relative = False
+            elif command == 'G91':
+                relative = True
+            elif command.startswith('M') and command not in ('M3', 'M4', 'M5', 'M7', 'M8', 'M9'):
+                return ['error:20']
+        if not jog:
+            self.relative = relative
+        words = dict(self.WORD.findall(re.sub(r'[GM]\d+', '', line)))
+        for axis in 'XYZ':
+            if axis in words:
+                value = float(words[axis])
+                self.position[axis] = self.position[axis] + value if relative else value
+        return ['ok']
+
+
+class ReplayDevice(VirtualDevice):
+    """
+    Firmware stand-in answering with the replies of a capture.py session
+    Every line, or realtime byte, received is matched by rank to the one sent
+    in the capture, and the replies recorded after it are written back after
+    their recorded delay divided by speed. A line differing from the recorded
+    one is listed in mismatches as (rank, expected, received), the replay
+    goes on regardless.
+    """
+
+    def __init__(self, filename, speed=1.0):
+        """
+        :param str filename: capture written by capture.CaptureSerial
+        :param float speed: 1 replays at the recorded pace, 10 ten times faster, None without delays
+        """
+        self.header, events = read_capture(filename)
+        self.speed = speed
+        self.expected = []
+        # replies[k + 1] follow the k-th line sent, replies[0] come before any
+        self.replies = [[]]
+        self.mismatches = []
+        self.realtime = bytes(sorted({char for t, direction, data in events
+                                      if direction == TX and b'\n' not in data for char in data}))
+        triggered = 0.0
+        pending = b''
+        for t, direction, data in events:
+            if direction == RX:
+                self.replies[-1].append((t - triggered, data))
+                continue
+            triggered = t
+            if b'\n' not in data:
+                for char in data:
+                    self.expected.append(chr(char))
+                    self.replies.append([])
+                continue
+            pending += data
+            while b'\n' in pending:
+                line, pending = pending.split(b'\n', 1)
+                line = line.strip().decode('utf-8', errors='replace')
+                if line:
+                    self.expected.append(line)
+                    self.replies.append([])
+        self._rank = 0
+        self._outgoing = queue.Queue()
+        super().__init__()
+        self._emitter = threading.Thread(target=self._emit, daemon=True)
+        self._emitter.start()
+        self._schedule(self.replies[0])
+
+    def finished(self):
+        """
+        :return: True once every recorded line has been received
+        """
+        return self._rank >= len(self.expected)
+
+    def handle(self, line):
+        rank = self._rank
+        self._rank += 1
+        expected = self.expected[rank] if rank < len(self.expected) else None
+        if line != expected:
+            self.mismatches.append((rank, expected, line))
+        if expected is not None:
+            self._schedule(self.replies[rank + 1])
+        return []
+
+    def handle_realtime(self, char):
+        return self.handle(char)
+
+    def _schedule(self, replies):
+        now = time.monotonic()
+        for delay, data in replies:
+            self._outgoing.put((now + delay / self.speed if self.speed else now, data))
+
+    def _emit(self):
+        while True:
+            item = self._outgoing.get()
+            if item is None:
+                break
+            due, data = item
+            time.sleep(max(0.0, due - time.monotonic()))
+            os.write(self._master, data)
+
+    def close(self):
+        self._outgoing.put(None)
+        self._emitter.join()
+        super().close()
+
+
+class VirtualMoonraker:
+    """
+    Moonraker JSON-RPC API of a Klipper 3 axis stage on a unix socket
+    Handles printer.info, printer.gcode.script (G0/G1/G28/G90/G91/M114/M400),
+    printer.objects.query/subscribe on toolhead and printer.emergency_stop.
+    Subscribers get notify_status_update after every script.
+    """
+
+    WORD = re.compile(r'([A-Z])\s*(-?[0-9.]+)')
+
+    def __init__(self, path=None):
+        import tempfile
+        self.path = path or os.path.join(tempfile.mkdtemp(), 'moonraker.sock')
+        self.position = [0.0, 0.0, 0.0, 0.0]
+        self.relative = False
+        self.scripts = []
+        self._clients = []
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while self._running:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                break
+            self._clients.append(client)
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _send(self, client, message):
+        try:
+            client.sendall(json.dumps(message).encode('utf-8') + b'\x03')
+        except OSError:
+            pass
+
+    def _serve(self, client):
+        buffer = b''
+        subscribed = False
+        while self._running:
+            try:
+                data = client.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            buffer += data
+            while b'\x03' in buffer:
+                raw, buffer = buffer.split(b'\x03', 1)
+                request = json.loads(raw)
+                method, params = request['method'], request.get('params') or {}
+                reply = {'jsonrpc': '2.0', 'id': request['id']}
+                if method == 'printer.info':
+                    reply['result'] = {'state': 'ready', 'software_version': 'v0.12.0-stand-in'}
+                elif method in ('printer.objects.query', 'printer.objects.subscribe'):
+                    subscribed = subscribed or method.endswith('subscribe')
+                    reply['result'] = {'eventtime': time.monotonic(), 'status': self.status()}
+                elif method == 'printer.gcode.script':
+                    responses = []
+                    for line in params['script'].splitlines():
+                        responses += self.execute(line)
+                    for response in responses:
+                        self._send(client, {'jsonrpc': '2.0', 'method': 'notify_gcode_response',
+                                            'params': [response]})
+                    if subscribed:
+                        self._send(client, {'jsonrpc': '2.0', 'method': 'notify_status_update',
+                                            'params': [self.status(), time.monotonic()]})
+                    reply['result'] = 'ok'
+                elif method in ('printer.emergency_stop', 'printer.firmware_restart'):
+                    reply['result'] = 'ok'
+                else:
+                    reply['error'] = {'code': -32601, 'message': f'Method not found: {method}'}
+                self._send(client, reply)
+
+    def status(self):
+        return {'toolhead': {'position': list(self.position), 'homed_axes': 'xyz'}}
+
+    def execute(self, line):
+        line = line.split(';', 1)[0].strip().upper()
+        self.scripts.append(line)
+        command = line.split(maxsplit=1)[0] if line else ''
+        words = dict(self.WORD.findall(line[len(command):]))
+        if command in ('G0', 'G1'):
+            for i, axis in enumerate('XYZ'):
+                if axis in words:
+                    value = float(words[axis])
+                    self.position[i] = self.position[i] + value if self.relative else value
+        elif command == 'G28':
+            self.position = [0.0, 0.0, 0.0, 0.0]
+        elif command == 'G90':
+            self.relative = False
+        elif command == 'G91':
+            self.relative = True
+        elif command == 'M114':
+            x, y, z, e = self.position
+            return [f'X:{x:.3f} Y:{y:.3f} Z:{z:.3f} E:{e:.3f}']
+        return []
+
+    def close(self):
+        self._running = False
+        self._server.close()
+        for client in self._clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+        os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
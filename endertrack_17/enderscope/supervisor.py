@@ -0,0 +1,153 @@
+"""
+Supervision of a stage serial link.
+
+A USB serial link that drops leaves the port object looking open while every
+write fails. LinkSupervisor notices the drop, either from the errors the stage
+reports or from a periodic heartbeat that gets no answer, and reconnects in
+the background with exponential backoff::
+
+    supervisor = LinkSupervisor(stage).start()
+    supervisor.status()
+
+The stage provides heartbeat(timeout) and reconnect(), which restores the
+modal state recorded by update_modal() and re-reads the position with M114.
+"""
+import collections
+import threading
+import time
+
+import serial
+
+from telemetry import REGISTRY, get_logger
+
+log = get_logger('link')
+LINK_EVENTS = REGISTRY.counter('enderscope_link_events_total',
+                               'Serial link supervision events', ['kind'])
+
+MODAL_GROUPS = {'G20': 'units', 'G21': 'units', 'G90': 'distance', 'G91': 'distance'}
+LINK_ERRORS = (serial.SerialException, OSError, TimeoutError)
+
+
+def update_modal(modal, command):
+    """
+    Records the modal state set by a G-code line
+    :param dict modal: 'units', 'distance' and 'feedrate' of the stage, updated in place
+    """
+    words = command.split()
+    if not words:
+        return
+    code = words[0].upper()
+    group = MODAL_GROUPS.get(code)
+    if group:
+        modal[group] = code
+    elif code in ('G0', 'G1'):
+        for word in words[1:]:
+            if word[:1].upper() == 'F' and len(word) > 1:
+                modal['feedrate'] = word[1:]
+
+
+def restore_commands(modal):
+    """
+    :return: the G-code lines that bring a freshly reset firmware back to modal
+    """
+    commands = [modal[group] for group in ('units', 'distance') if group in modal]
+    if 'feedrate' in modal:
+        commands.append(f"G0 F{modal['feedrate']}")
+    return commands
+
+
+class LinkSupervisor:
+    """
+    Keeps a stage link alive: heartbeat, background reconnection, event log
+    """
+
+    def __init__(self, stage, heartbeat=2.0, timeout=3.0, backoff=0.5, max_backoff=10.0):
+        """
+        :param stage: Stage to supervise
+        :param float heartbeat: s between liveness checks while the link is up
+        :param float timeout: s without any reply before the link is declared lost
+        :param float backoff: first delay between reconnection attempts in s, doubled up to max_backoff
+        """
+        self.stage = stage
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.state = 'connected'
+        self.reconnects = 0
+        self.events = collections.deque(maxlen=200)
+        self._seq = 0
+        self._lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        stage.on_link_error = self.link_lost
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._lost.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.stage.on_link_error = None
+
+    def _record(self, kind, message):
+        self._seq += 1
+        self.events.append({'seq': self._seq, 'time': time.time(), 'kind': kind, 'message': message})
+        LINK_EVENTS.labels(kind=kind).inc()
+
+    def link_lost(self, error):
+        """
+        Marks the link as lost, called by the stage on read or write errors
+        """
+        if self.state != 'connected':
+            return
+        self.state = 'reconnecting'
+        self.stage.connected = False
+        self._record('lost', str(error))
+        log.warning("🔌 Liaison série perdue: %s", error)
+        self._lost.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._lost.wait(self.heartbeat):
+                if not self._stop.is_set():
+                    self._reconnect()
+                continue
+            try:
+                alive = self.stage.heartbeat(self.timeout)
+            except LINK_ERRORS as e:
+                self.link_lost(e)
+                continue
+            if not alive:
+                self.link_lost('heartbeat sans réponse')
+
+    def _reconnect(self):
+        delay = self.backoff
+        while not self._stop.is_set():
+            try:
+                self.stage.reconnect()
+            except LINK_ERRORS as e:
+                self._record('retry', str(e))
+                log.debug("Reconnexion échouée (%s), nouvel essai dans %.1f s", e, delay)
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+            self.reconnects += 1
+            self.state = 'connected'
+            self._lost.clear()
+            self._record('reconnected', f"position {self.stage.position}")
+            log.info("✅ Liaison série rétablie (%d reconnexions)", self.reconnects)
+            return
+
+    def status(self):
+        return {
+            'state': self.state,
+            'reconnects': self.reconnects,
+            'last_event': self.events[-1] if self.events else None,
+        }
+
+    def events_since(self, seq=0):
+        return [e for e in list(self.events) if e['seq'] > seq]
@@ -0,0 +1,309 @@
+"""
+Metrics and logging shared by the drivers, the hardware server and the bridges.
+
+Metrics are kept in process and rendered in the Prometheus text format on
+demand, recording one costs a lock and an addition::
+
+    RTT = REGISTRY.histogram('enderscope_serial_ack_seconds',
+                             'Time from write to ok', ['command'])
+    with RTT.labels(command='G0').time():
+        stage.write_code('G0 X10')
+    REGISTRY.render()
+
+Logging goes through a queue drained by a background thread, so a slow
+terminal never stalls the serial or HTTP paths. The level comes from
+setup_logging(level) or the ENDERSCOPE_LOG_LEVEL environment variable.
+"""
+import atexit
+import bisect
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterValue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeValue:
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """
+        Evaluates function at scrape time instead of storing a value
+        """
+        self.function = function
+
+    def get(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception:
+            return float('nan')
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _samples(self, key, child):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.kind}']
+        for key, child in self.children():
+            lines.extend(self._samples(key, child))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _samples(self, key, child):
+        labels = _format_labels(self.labelnames, key)
+        return [f'{self.name}{labels} {_format_value(child.value)}']
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def _samples(self, key, child):
+        labels = _format_labels(self.labelnames, key)
+        return [f'{self.name}{labels} {_format_value(child.get())}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _samples(self, key, child):
+        with child._lock:
+            counts = list(child.counts)
+            total, total_sum = child.count, child.sum
+        lines = []
+        cumulative = 0
+        for bound, c in zip(self.buckets + (float('inf'),), counts):
+            cumulative += c
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total_sum)}')
+        lines.append(f'{self.name}_count{labels} {total}')
+        return lines
+
+
+class Registry:
+    """
+    Named metrics, created once and shared by whoever asks for the same name
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f'{name} is already registered as a {metric.kind}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, documentation, labelnames, buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=REGISTRY):
+    """
+    Serves registry.render() on http://host:port/api/metrics from a daemon thread
+    for processes that have no web server of their own
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/api/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_listener = None
+
+
+def setup_logging(level=None):
+    """
+    Sends the 'enderscope' loggers through a non-blocking queue handler
+    :param level: logging level name or number, defaults to $ENDERSCOPE_LOG_LEVEL or INFO
+    """
+    global _listener
+    logger = logging.getLogger('enderscope')
+    if level is None:
+        level = os.environ.get('ENDERSCOPE_LOG_LEVEL', 'INFO')
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if _listener is not None:
+        return logger
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.propagate = False
+    return logger
+
+
+def get_logger(name):
+    return logging.getLogger(f'enderscope.{name}')
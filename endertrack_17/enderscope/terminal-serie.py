@@ -1,57 +1,85 @@
 #!/usr/bin/env python3
 # Terminal série simple pour communiquer avec l'Enderscope
+# Avec --server, se branche sur la connexion du serveur matériel (console.py)
+# au lieu d'ouvrir le port, qui reste au serveur
 
+import argparse
+import os
 import serial
 import threading
 import sys
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
 def read_from_port(ser):
-    """Lit en continu depuis le port série"""
+    """Lit depuis le port série, bloqué sur read() jusqu'à l'arrivée de données"""
     while True:
         try:
-            if ser.in_waiting > 0:
-                data = ser.read(ser.in_waiting).decode('utf-8', errors='ignore')
-                if data.strip():
-                    print(f"<< {data.strip()}")
-        except:
+            data = ser.read(ser.in_waiting or 1).decode('utf-8', errors='ignore')
+            if data.strip():
+                print(f"<< {data.strip()}")
+        except (serial.SerialException, OSError, TypeError):
             break
 
+def read_from_server(sock):
+    """Affiche les lignes diffusées par le serveur, bloqué sur la socket"""
+    with sock.makefile('r', encoding='utf-8', errors='replace') as lines:
+        for line in lines:
+            print(line.rstrip('\n'))
+    print("\n🔌 Connexion au serveur fermée")
+
 def main():
+    parser = argparse.ArgumentParser(description="Terminal série pour l'Enderscope")
+    parser.add_argument('--port', default='/dev/ttyUSB0', help='port série (défaut /dev/ttyUSB0)')
+    parser.add_argument('--baud', type=int, default=115200, help='baudrate (défaut 115200)')
+    parser.add_argument('--server', nargs='?', const='', metavar='ADRESSE',
+                        help="partage la connexion du serveur matériel (socket unix ou hôte:port)")
+    args = parser.parse_args()
     try:
         print("🔍 Terminal série pour Enderscope")
-        print("Port: /dev/ttyUSB0, Baudrate: 115200")
+        if args.server is not None:
+            from console import ADDRESS, connect_console
+            address = args.server or os.environ.get('ENDERSCOPE_CONSOLE', ADDRESS)
+            print(f"Serveur: {address}")
+            link = connect_console(address)
+            reader = read_from_server
+            send = lambda command: link.sendall(f"{command}\n".encode('utf-8'))
+        else:
+            print(f"Port: {args.port}, Baudrate: {args.baud}")
+            # Ouvrir le port série
+            link = serial.Serial(args.port, args.baud, timeout=1)
+            reader = read_from_port
+            def send(command):
+                link.write(f"{command}\n".encode('utf-8'))
+                print(f">> {command}")
         print("Tapez vos commandes G-code. 'quit' pour quitter.")
         print("-" * 50)
-        
-        # Ouvrir le port série
-        ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
-        
+
         # Thread pour lire les réponses
-        reader_thread = threading.Thread(target=read_from_port, args=(ser,))
+        reader_thread = threading.Thread(target=reader, args=(link,))
         reader_thread.daemon = True
         reader_thread.start()
-        
+
         # Boucle principale pour envoyer des commandes
         while True:
             try:
                 command = input(">> ").strip()
-                
+
                 if command.lower() == 'quit':
                     break
-                
+
                 if command:
                     # Envoyer la commande
-                    ser.write(f"{command}\n".encode('utf-8'))
-                    print(f">> {command}")
-                    
-            except KeyboardInterrupt:
+                    send(command)
+
+            except (KeyboardInterrupt, EOFError):
                 break
-        
-        ser.close()
+
+        link.close()
         print("\n🔌 Terminal fermé")
-        
+
     except Exception as e:
         print(f"💥 Erreur: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
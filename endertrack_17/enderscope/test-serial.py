@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
 # Test simple de la connexion série
 
+import argparse
 import serial
 import time
 
-def test_serial():
+def test_serial(port='/dev/ttyUSB0', baud=115200):
     try:
         print("🔍 Test connexion série...")
         
         # Ouvrir le port
-        ser = serial.Serial('/dev/ttyUSB0', 115200, timeout=1)
+        ser = serial.Serial(port, baud, timeout=1)
         print(f"✅ Port ouvert: {ser.is_open}")
         
         # Attendre un peu
@@ -35,4 +36,8 @@ def test_serial():
         print(f"💥 Erreur: {e}")
 
 if __name__ == "__main__":
-    test_serial()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Test simple de la connexion série")
+    parser.add_argument('--port', default='/dev/ttyUSB0', help='port série (défaut /dev/ttyUSB0)')
+    parser.add_argument('--baud', type=int, default=115200, help='baudrate (défaut 115200)')
+    args = parser.parse_args()
+    test_serial(args.port, args.baud)
\ No newline at end of file
@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+"""
+Démon d'entrée EnderTrack : MIDI (ALSA ou PortMidi), manettes et HID sur ws://localhost:8765
+
+    python3 input-daemon.py [--backends alsa,joystick,hidraw] [--listen all]
+"""
+from inputs.daemon import main
+
+if __name__ == "__main__":
+    main()
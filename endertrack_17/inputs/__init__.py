@@ -0,0 +1,8 @@
+"""
+Input devices for EnderTrack's external controllers: MIDI, gamepads and HID
+devices behind a single websocket daemon.
+"""
+from .events import InputEvent, input_event, midi_event
+from .backend import Backend
+from .framing import encode_frame, decode_frame
+from .daemon import InputDaemon, BACKENDS, main
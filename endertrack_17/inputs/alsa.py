@@ -0,0 +1,79 @@
+"""
+MIDI devices of the ALSA sequencer, listed by aconnect and read through aseqdump.
+
+aseqdump runs as an asyncio subprocess, its output is read on the event loop
+without a thread.
+"""
+import asyncio
+import re
+import shutil
+import subprocess
+
+from .backend import Backend
+from .events import midi_event, NOTE_OFF, NOTE_ON, CONTROL_CHANGE
+
+# clients of the system, not devices
+SYSTEM_CLIENTS = ('System', 'Midi Through', 'PipeWire-System', 'PipeWire-RT-Event', 'TiMidity')
+CLIENT = re.compile(r"client (\d+): '([^']*)'")
+MESSAGE = re.compile(r'(Note on|Note off|Control change)\s+(\d+), (?:note|controller) (\d+), (?:velocity|value) (\d+)')
+STATUS = {'Note on': NOTE_ON, 'Note off': NOTE_OFF, 'Control change': CONTROL_CHANGE}
+
+
+def parse_aseqdump(line):
+    """
+    :return: (status, data1, data2) of a note or control change line, None otherwise
+    """
+    match = MESSAGE.search(line)
+    if not match:
+        return None
+    kind, channel, data1, data2 = match.groups()
+    return STATUS[kind] | int(channel), int(data1), int(data2)
+
+
+class AlsaBackend(Backend):
+    name = 'alsa'
+    family = 'midi'
+
+    def available(self):
+        return bool(shutil.which('aconnect') and shutil.which('aseqdump'))
+
+    def scan(self):
+        result = subprocess.run(['aconnect', '-l'], capture_output=True, text=True, timeout=5)
+        usb = ''
+        if shutil.which('lsusb'):
+            usb = subprocess.run(['lsusb'], capture_output=True, text=True, timeout=5).stdout.lower()
+        devices = []
+        for line in result.stdout.splitlines():
+            match = CLIENT.search(line)
+            if not match or '[type=' not in line:
+                continue
+            client_id, name = match.groups()
+            if name in SYSTEM_CLIENTS:
+                continue
+            connected = True
+            if 'mpk' in name.lower() and usb:
+                # ALSA keeps listing an MPK for a while after it is unplugged
+                connected = 'mpk' in usb or 'akai' in usb
+            devices.append({'id': f'midi_{client_id}', 'name': name, 'type': 'midi',
+                            'client_id': client_id, 'connected': connected})
+        return devices
+
+    def start(self, device, emit):
+        task = asyncio.ensure_future(self._read(device, emit))
+        return task.cancel
+
+    async def _read(self, device, emit):
+        process = await asyncio.create_subprocess_exec(
+            'aseqdump', '-p', f"{device['client_id']}:0",
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            async for line in process.stdout:
+                message = parse_aseqdump(line.decode('utf-8', errors='replace'))
+                if message:
+                    event = midi_event(device['id'], *message)
+                    if event:
+                        emit(event)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
@@ -0,0 +1,74 @@
+"""
+Base class of the input backends.
+"""
+import asyncio
+import os
+
+
+class Backend:
+    """
+    A kind of input device: lists the devices and listens to them on the
+    daemon's event loop
+
+    Devices are dicts with at least id, name, type and connected, the keys
+    the frontend shows; backends add what they need to open the device.
+    Backends of the same family see the same devices, the daemon only scans
+    the first available one.
+    """
+
+    name = ''
+    family = ''
+
+    def available(self):
+        """
+        :return: False when a library or tool the backend needs is missing
+        """
+        return True
+
+    def scan(self):
+        """
+        :return: list of device dicts, blocking calls allowed (run in an executor)
+        """
+        return []
+
+    def start(self, device, emit):
+        """
+        Starts listening to device, called on the event loop
+        :param emit: called with every InputEvent, from any thread
+        :return: callable stopping the listening
+        """
+        raise NotImplementedError
+
+
+def watch(path, on_data, size=4096):
+    """
+    Opens a device file non-blocking and calls on_data(bytes) from the event
+    loop each time a read returns data, without any thread
+    :param int size: bytes read at most at once
+    :return: callable closing the device, once the device is gone too
+    """
+    loop = asyncio.get_running_loop()
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    closed = []
+
+    def readable():
+        try:
+            data = os.read(fd, size)
+        except BlockingIOError:
+            return
+        except OSError:  # unplugged
+            data = b''
+        if data:
+            on_data(data)
+        else:
+            stop()
+
+    def stop():
+        if closed:
+            return
+        closed.append(True)
+        loop.remove_reader(fd)
+        os.close(fd)
+
+    loop.add_reader(fd, readable)
+    return stop
@@ -0,0 +1,247 @@
+"""
+The input daemon: every backend on one event loop, one websocket endpoint.
+
+Devices of all backends are listed together; the frontend asks for the ones
+it wants with start_listening, or the daemon starts those matching --listen.
+Each event is broadcast once to every connected client, nothing is polled:
+file descriptors and subprocess pipes are watched by the event loop, RtMidi
+calls back from its own thread, only PortMidi needs a polling thread.
+
+Messages sent: {'type': 'devices', 'devices': [...]} on connection and after
+scan_devices, {'type': 'input', 'data': {device_id, type, control, value,
+timestamp}} per event, {'type': 'pong'} to a ping. Clients that negotiate
+the binary format with a hello get the events of each loop iteration in one
+binary frame instead, see framing.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+
+import websockets
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'enderscope'))
+from telemetry import REGISTRY, setup_logging, get_logger, start_metrics_server  # noqa: E402
+
+from .rtmidiin import RtMidiBackend  # noqa: E402
+from .alsa import AlsaBackend  # noqa: E402
+from .portmidi import PortMidiBackend  # noqa: E402
+from .joystick import JoystickBackend  # noqa: E402
+from .hidraw import HidrawBackend  # noqa: E402
+from .framing import VERSION, negotiate, encode_frame  # noqa: E402
+
+HOST, PORT = 'localhost', 8765
+# events per binary frame at most
+BATCH = 1024
+METRICS_PORT = 8766
+# by preference, the first available of a family is used
+BACKENDS = {'rtmidi': RtMidiBackend, 'alsa': AlsaBackend, 'portmidi': PortMidiBackend,
+            'joystick': JoystickBackend, 'hidraw': HidrawBackend}
+# mapped by the frontend, always there
+KEYBOARD = {'id': 'keyboard_system', 'name': 'Clavier Système', 'type': 'keyboard', 'connected': True}
+
+log = get_logger('inputs')
+INPUT_EVENTS = REGISTRY.counter('enderscope_input_events_total',
+                                'Input events received from devices', ['source'])
+EVENTS_SENT = REGISTRY.counter('enderscope_input_events_sent_total',
+                               'Input events sent to websocket clients')
+FRAMES_SENT = REGISTRY.counter('enderscope_input_frames_sent_total',
+                               'Websocket frames of input events sent to clients', ['format'])
+
+
+def matches(device, patterns):
+    """
+    :param patterns: 'all', device ids, device types or parts of device names
+    """
+    name = device['name'].lower()
+    return any(p == 'all' or p == device['id'] or p == device['type'] or p.lower() in name
+               for p in patterns)
+
+
+class InputDaemon:
+    def __init__(self, backends=None, listen=(), host=HOST, port=PORT):
+        """
+        :param backends: names in BACKENDS, None for all of them
+        :param listen: devices listened to from the start, see matches()
+        """
+        self.backends = [BACKENDS[name]() for name in (BACKENDS if backends is None else backends)]
+        self.listen = list(listen)
+        self.host = host
+        self.port = port
+        self.devices = []
+        self.clients = set()
+        self.binary_clients = set()
+        self._pending = []
+        self._owners = {}
+        self._listeners = {}
+        self._loop = None
+        self._loop_thread = None
+        REGISTRY.gauge('enderscope_input_clients', 'Websocket clients of the input daemon').set_function(
+            lambda: len(self.clients))
+
+    async def scan_devices(self):
+        """
+        Lists the devices of the available backends, one per family, scans run in an executor
+        """
+        loop = asyncio.get_running_loop()
+        devices = []
+        families = set()
+        for backend in self.backends:
+            if backend.family in families or not backend.available():
+                continue
+            if backend.family:
+                families.add(backend.family)
+            try:
+                found = await loop.run_in_executor(None, backend.scan)
+            except Exception as e:
+                log.error("❌ Erreur scan %s: %s", backend.name, e)
+                continue
+            for device in found:
+                self._owners[device['id']] = backend
+            devices += found
+        devices.append(KEYBOARD)
+        self.devices = devices
+        log.info("🔍 %d périphériques détectés:", len(devices))
+        for device in devices:
+            log.info("  %s %s (%s)", '✅' if device['connected'] else '❌', device['name'], device['type'])
+        return devices
+
+    def start_listening(self, device_id):
+        if device_id in self._listeners:
+            return
+        device = next((d for d in self.devices if d['id'] == device_id), None)
+        backend = self._owners.get(device_id)
+        if not device or not backend or not device['connected']:
+            return
+        try:
+            self._listeners[device_id] = backend.start(device, self.emit)
+            log.info("🎧 Écoute: %s (%s)", device['name'], backend.name)
+        except OSError as e:
+            log.error("❌ Impossible d'ouvrir %s: %s", device['name'], e)
+
+    def stop_listening(self, device_id):
+        stop = self._listeners.pop(device_id, None)
+        if stop:
+            stop()
+            log.info("🛑 Arrêt écoute: %s", device_id)
+
+    def emit(self, event):
+        """
+        Broadcasts an InputEvent, from the event loop or any other thread
+        """
+        if threading.get_ident() == self._loop_thread:
+            self._publish(event)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, event)
+
+    def _publish(self, event):
+        backend = self._owners.get(event.device_id)
+        INPUT_EVENTS.labels(source=backend.name if backend else 'unknown').inc()
+        json_clients = self.clients - self.binary_clients if self.binary_clients else self.clients
+        if json_clients:
+            websockets.broadcast(json_clients, json.dumps({'type': 'input', 'data': event._asdict()}))
+            EVENTS_SENT.inc(len(json_clients))
+            FRAMES_SENT.labels(format='json').inc(len(json_clients))
+        if self.binary_clients:
+            if not self._pending:
+                self._loop.call_soon(self._flush)
+            self._pending.append(event)
+
+    def _flush(self):
+        """
+        Sends the events of the loop iteration that just ran to the binary clients
+        """
+        events, self._pending = self._pending, []
+        clients = self.binary_clients
+        if not clients:
+            return
+        for start in range(0, len(events), BATCH):
+            websockets.broadcast(clients, encode_frame(events[start:start + BATCH]))
+            FRAMES_SENT.labels(format='binary').inc(len(clients))
+        EVENTS_SENT.inc(len(events) * len(clients))
+
+    async def handler(self, websocket):
+        log.info("🔗 Client connecté")
+        self.clients.add(websocket)
+        try:
+            await websocket.send(json.dumps({'type': 'devices', 'devices': self.devices}))
+            async for message in websocket:
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+                kind = data.get('type')
+                if kind == 'scan_devices':
+                    await self.scan_devices()
+                    await websocket.send(json.dumps({'type': 'devices', 'devices': self.devices}))
+                elif kind == 'start_listening':
+                    self.start_listening(data.get('device_id'))
+                elif kind == 'stop_listening':
+                    self.stop_listening(data.get('device_id'))
+                elif kind == 'ping':
+                    await websocket.send(json.dumps({'type': 'pong'}))
+                elif kind == 'hello':
+                    format = negotiate(data.get('formats'))
+                    await websocket.send(json.dumps({'type': 'hello', 'format': format, 'version': VERSION}))
+                    if format == 'binary':
+                        self.binary_clients.add(websocket)
+                    else:
+                        self.binary_clients.discard(websocket)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.clients.discard(websocket)
+            self.binary_clients.discard(websocket)
+            log.info("🔗 Client déconnecté")
+
+    async def serve(self, ready=None):
+        """
+        Runs until cancelled
+        :param ready: asyncio.Event set once clients can connect
+        """
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        await self.scan_devices()
+        for device in self.devices:
+            if matches(device, self.listen):
+                self.start_listening(device['id'])
+        try:
+            async with websockets.serve(self.handler, self.host, self.port):
+                log.info("🌐 Input daemon démarré sur ws://%s:%d", self.host, self.port)
+                if ready:
+                    ready.set()
+                await asyncio.Future()
+        finally:
+            for device_id in list(self._listeners):
+                self.stop_listening(device_id)
+
+
+def main(argv=None, backends=None, listen=()):
+    """
+    Command line of input-daemon.py, the defaults let the bridge shims pick their backends
+    """
+    arguments = argparse.ArgumentParser(description="Démon d'entrée unique : MIDI, manettes, HID sur un websocket")
+    arguments.add_argument('--backends', default=','.join(backends or BACKENDS),
+                           help=f"parmi {','.join(BACKENDS)} (défaut: tous)")
+    arguments.add_argument('--listen', default=','.join(listen),
+                           help="périphériques écoutés dès le départ: all, id, type ou partie du nom")
+    arguments.add_argument('--host', default=HOST)
+    arguments.add_argument('--port', type=int, default=PORT)
+    arguments.add_argument('--metrics-port', type=int, default=METRICS_PORT, help='0 pour désactiver')
+    options = arguments.parse_args(argv)
+    names = [name for name in options.backends.split(',') if name]
+    unknown = set(names) - set(BACKENDS)
+    if unknown:
+        arguments.error(f"backends inconnus: {', '.join(sorted(unknown))}")
+
+    setup_logging()
+    if options.metrics_port:
+        start_metrics_server(options.metrics_port)
+        log.info("📊 Métriques sur http://localhost:%d/api/metrics", options.metrics_port)
+    daemon = InputDaemon(names, [p for p in options.listen.split(',') if p], options.host, options.port)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        pass
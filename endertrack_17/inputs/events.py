@@ -0,0 +1,36 @@
+"""
+Normalized input events, the same for every backend.
+
+An event is what the frontend receives in ``{'type': 'input', 'data': ...}``:
+which device, which kind of control (note, cc, button, axis, hid), which
+control number and its new value.
+"""
+import collections
+import time
+
+InputEvent = collections.namedtuple('InputEvent', 'device_id type control value timestamp')
+
+NOTE_OFF, NOTE_ON, CONTROL_CHANGE = 0x80, 0x90, 0xB0
+
+
+def input_event(device_id, type, control, value, timestamp=None):
+    """
+    :param str type: 'note', 'cc', 'button', 'axis' or 'hid'
+    :param float timestamp: time.time() of the event, defaults to now
+    """
+    return InputEvent(device_id, type, control, value, time.time() if timestamp is None else timestamp)
+
+
+def midi_event(device_id, status, data1, data2, timestamp=None):
+    """
+    :param int status: MIDI status byte, the channel is dropped
+    :return: InputEvent of a note (value 0 on release) or a control change, None for other messages
+    """
+    kind = status & 0xF0
+    if kind == NOTE_ON:
+        return input_event(device_id, 'note', data1, data2, timestamp)
+    if kind == NOTE_OFF:
+        return input_event(device_id, 'note', data1, 0, timestamp)
+    if kind == CONTROL_CHANGE:
+        return input_event(device_id, 'cc', data1, data2, timestamp)
+    return None
@@ -0,0 +1,74 @@
+"""
+Generic HID devices through Linux hidraw (/dev/hidraw*).
+
+Devices are listed from sysfs. The report descriptor, parsed once per
+vendor/product (hidreport.py), gives the fields of the input reports. Reports
+are read non-blocking on the event loop; every field that changed since the
+previous report of the same id becomes a 'hid' event, control being the
+field's index in the descriptor. Foot pedals, 3D mice, jog wheels...
+"""
+import glob
+import os
+
+from .backend import Backend, watch
+from .hidreport import layout_for, ReportDecoder
+
+
+def read_uevent(path):
+    """
+    :return: dict of the KEY=value lines of a sysfs uevent file, empty if unreadable
+    """
+    try:
+        with open(path) as f:
+            return dict(line.rstrip('\n').split('=', 1) for line in f if '=' in line)
+    except OSError:
+        return {}
+
+
+def vendor_product(hid_id):
+    """
+    :param str hid_id: HID_ID of uevent, bus:vendor:product in hex
+    :return: (vendor, product) as 4 digit hex strings, None if malformed
+    """
+    try:
+        _, vendor, product = hid_id.split(':')
+        return f'{int(vendor, 16):04x}', f'{int(product, 16):04x}'
+    except ValueError:
+        return None
+
+
+def read_descriptor(node):
+    """
+    :param str node: hidrawN
+    :return: bytes of the report descriptor
+    """
+    with open(f'/sys/class/hidraw/{node}/device/report_descriptor', 'rb') as f:
+        return f.read()
+
+
+class HidrawBackend(Backend):
+    name = 'hidraw'
+
+    def available(self):
+        return os.path.isdir('/sys/class/hidraw')
+
+    def scan(self):
+        devices = []
+        for path in sorted(glob.glob('/sys/class/hidraw/hidraw*')):
+            node = os.path.basename(path)
+            uevent = read_uevent(os.path.join(path, 'device', 'uevent'))
+            vendor, product = vendor_product(uevent.get('HID_ID', '')) or (None, None)
+            devices.append({'id': f'hid_{node}', 'name': uevent.get('HID_NAME', node), 'type': 'hid',
+                            'vendor_id': vendor, 'product_id': product, 'device_path': f'/dev/{node}',
+                            'connected': os.access(f'/dev/{node}', os.R_OK)})
+        return devices
+
+    def start(self, device, emit):
+        node = os.path.basename(device['device_path'])
+        layout = layout_for(device['vendor_id'], device['product_id'], lambda: read_descriptor(node))
+        decoder = ReportDecoder(device['id'], layout)
+
+        def received(report):
+            for event in decoder.decode(report):
+                emit(event)
+        return watch(device['device_path'], received)
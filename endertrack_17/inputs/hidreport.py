@@ -0,0 +1,238 @@
+"""
+HID report descriptors and the decoding of input reports.
+
+The descriptor is parsed once per vendor/product into the bit fields of each
+input report. A report is then taken as one little endian integer: XOR with
+the previous report of the same id tells which bits changed, and only the
+fields over those bits are extracted (shift and mask) and emitted. Relative
+fields (jog wheels, 3D mice) report moves, they are emitted whenever not 0.
+
+Works on recorded bytes as well as on a device, e.g. for a foot pedal:
+
+    cat /dev/hidraw0 > pedal.bin    # press it a few times, Ctrl+C
+    python -m inputs.hidreport /sys/class/hidraw/hidraw0/device/report_descriptor pedal.bin
+"""
+import argparse
+import collections
+
+from .events import input_event
+
+# item types and tags of the short items, HID 1.11 §6.2.2
+MAIN, GLOBAL, LOCAL = 0, 1, 2
+INPUT = 8
+USAGE_PAGE, LOGICAL_MINIMUM, LOGICAL_MAXIMUM = 0, 1, 2
+REPORT_SIZE, REPORT_ID, REPORT_COUNT, PUSH, POP = 7, 8, 9, 10, 11
+USAGE, USAGE_MINIMUM, USAGE_MAXIMUM = 0, 1, 2
+# Input item flags
+CONSTANT, VARIABLE, RELATIVE = 0x01, 0x02, 0x04
+LONG_ITEM = 0xFE
+
+Field = collections.namedtuple('Field', 'control report_id offset size signed usage_page usage '
+                                        'minimum maximum variable relative')
+
+
+def _items(descriptor):
+    """
+    :return: iterator of (type, tag, unsigned data, signed data) of the short items
+    """
+    i = 0
+    while i < len(descriptor):
+        prefix = descriptor[i]
+        if prefix == LONG_ITEM:
+            i += 3 + (descriptor[i + 1] if i + 1 < len(descriptor) else 0)
+            continue
+        size = (0, 1, 2, 4)[prefix & 0x03]
+        raw = descriptor[i + 1:i + 1 + size]
+        i += 1 + size
+        yield prefix >> 2 & 0x03, prefix >> 4, int.from_bytes(raw, 'little'), int.from_bytes(raw, 'little', signed=True)
+
+
+class ReportLayout:
+    """
+    Input fields of a descriptor, by report id (None without report ids)
+    """
+
+    def __init__(self, fields, numbered, sizes):
+        """
+        :param bool numbered: reports start with their report id byte
+        :param dict sizes: bits of each report, padding included, id byte left out
+        """
+        self.fields = fields
+        self.numbered = numbered
+        self.sizes = sizes
+        self.reports = collections.defaultdict(list)
+        for field in fields:
+            self.reports[field.report_id].append(field)
+
+    def report_length(self, report_id):
+        """
+        :return: bytes of the input report, id byte included, 0 for unknown ids
+        """
+        if report_id not in self.sizes:
+            return 0
+        return (self.sizes[report_id] + 7) // 8 + (report_id is not None)
+
+
+def parse_descriptor(descriptor):
+    """
+    :param bytes descriptor: report descriptor, as in sysfs report_descriptor
+    :return: ReportLayout of the input reports; constant (padding) fields
+        and fields wider than 32 bits take room but are left out
+    """
+    state = {'page': 0, 'minimum': 0, 'maximum': 0, 'size': 0, 'count': 0, 'id': None}
+    stack = []
+    usages, usage_range = [], None
+    offsets = collections.Counter()
+    numbered = False
+    fields = []
+    for kind, tag, value, signed in _items(descriptor):
+        if kind == GLOBAL:
+            if tag == USAGE_PAGE:
+                state['page'] = value
+            elif tag == LOGICAL_MINIMUM:
+                state['minimum'] = signed
+            elif tag == LOGICAL_MAXIMUM:
+                # unsigned when the minimum is not negative, e.g. 0..255 in one byte
+                state['maximum'] = signed if state['minimum'] < 0 else value
+            elif tag == REPORT_SIZE:
+                state['size'] = value
+            elif tag == REPORT_ID:
+                state['id'] = value
+                numbered = True
+            elif tag == REPORT_COUNT:
+                state['count'] = value
+            elif tag == PUSH:
+                stack.append(dict(state))
+            elif tag == POP and stack:
+                state = stack.pop()
+        elif kind == LOCAL:
+            if tag == USAGE:
+                usages.append(value)
+            elif tag == USAGE_MINIMUM:
+                usage_range = [value, value]
+            elif tag == USAGE_MAXIMUM and usage_range:
+                usage_range[1] = value
+        elif kind == MAIN:
+            if tag == INPUT:
+                report_id, size = state['id'], state['size']
+                if usage_range:
+                    usages += range(usage_range[0], usage_range[1] + 1)
+                for index in range(state['count']):
+                    offset = offsets[report_id]
+                    offsets[report_id] += size
+                    if value & CONSTANT or not 0 < size <= 32:
+                        continue
+                    usage = usages[min(index, len(usages) - 1)] if usages else 0
+                    page = usage >> 16 or state['page']
+                    fields.append(Field(len(fields), report_id, offset + (8 if report_id is not None else 0), size,
+                                        state['minimum'] < 0 or size == 32, page, usage & 0xFFFF,
+                                        state['minimum'], state['maximum'],
+                                        bool(value & VARIABLE), bool(value & RELATIVE)))
+            # outputs and features have offsets of their own, collections only group
+            usages, usage_range = [], None
+    return ReportLayout(fields, numbered, dict(offsets))
+
+
+_layouts = {}
+
+
+def layout_for(vendor, product, read_descriptor):
+    """
+    :param read_descriptor: called with no argument for the descriptor bytes,
+        only for the first device of a vendor/product
+    :return: the cached ReportLayout
+    """
+    key = (vendor, product)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = parse_descriptor(read_descriptor())
+        if vendor and product:
+            _layouts[key] = layout
+    return layout
+
+
+class ReportDecoder:
+    """
+    Events of the fields that changed in successive input reports
+    """
+
+    def __init__(self, device_id, layout):
+        self.device_id = device_id
+        self.layout = layout
+        self._extractors = {report_id: [(field.control, field.offset, (1 << field.size) - 1,
+                                         1 << field.size - 1 if field.signed else 0, field.relative)
+                                        for field in fields]
+                            for report_id, fields in layout.reports.items()}
+        self._relative = {field.report_id for field in layout.fields if field.relative}
+        self._last = {}
+
+    def decode(self, report, timestamp=None):
+        """
+        :param bytes report: one input report, with its id byte if the device numbers them
+        :return: list of InputEvent, one per absolute field whose value
+            changed, the first report against all fields at 0, and one per
+            relative field not at 0; empty for unknown report ids
+        """
+        report_id = report[0] if self.layout.numbered and report else None
+        extractors = self._extractors.get(report_id)
+        if not extractors:
+            return []
+        bits = int.from_bytes(report, 'little')
+        changed = bits ^ self._last.get(report_id, 0)
+        self._last[report_id] = bits
+        if not changed and report_id not in self._relative:
+            return []
+        events = []
+        for control, offset, mask, sign, relative in extractors:
+            if relative:
+                # a move, none when 0 even right after one
+                value = bits >> offset & mask
+                if not value:
+                    continue
+            elif changed >> offset & mask:
+                value = bits >> offset & mask
+            else:
+                continue
+            if value & sign:
+                value -= sign << 1
+            events.append(input_event(self.device_id, 'hid', control, value, timestamp))
+        return events
+
+
+def split_reports(layout, data):
+    """
+    Cuts a recording (successive reads of the hidraw device) into reports
+    :return: iterator of reports
+    """
+    i = 0
+    while i < len(data):
+        report_id = data[i] if layout.numbered else None
+        length = layout.report_length(report_id)
+        if not length:
+            return
+        yield data[i:i + length]
+        i += length
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description="Décode un descripteur HID et un enregistrement de rapports")
+    arguments.add_argument('descriptor', help="fichier report_descriptor (sysfs) ou copie")
+    arguments.add_argument('recording', nargs='?', help="octets lus sur /dev/hidrawN")
+    options = arguments.parse_args(argv)
+    with open(options.descriptor, 'rb') as f:
+        layout = parse_descriptor(f.read())
+    for field in layout.fields:
+        print(f"{field.control:3d}  rapport {field.report_id}  bits {field.offset}+{field.size}  "
+              f"usage {field.usage_page:04x}:{field.usage:04x}  [{field.minimum}, {field.maximum}]"
+              f"{'' if field.variable else '  tableau'}{'  relatif' if field.relative else ''}")
+    if options.recording:
+        with open(options.recording, 'rb') as f:
+            data = f.read()
+        decoder = ReportDecoder('recording', layout)
+        for n, report in enumerate(split_reports(layout, data)):
+            for event in decoder.decode(report, 0.0):
+                print(f"rapport {n}: contrôle {event.control} = {event.value}")
+
+
+if __name__ == '__main__':
+    main()
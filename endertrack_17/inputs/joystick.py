@@ -0,0 +1,59 @@
+"""
+Gamepads and joysticks through the Linux joystick API (/dev/input/js*).
+
+The device is opened non-blocking and watched by the event loop with
+add_reader, each 8 byte js_event becomes a button or axis event. No jstest,
+no thread.
+"""
+import glob
+import os
+import struct
+
+from .backend import Backend, watch
+from .events import input_event
+
+# struct js_event: time (ms), value, type, number
+JS_EVENT = struct.Struct('<IhBB')
+JS_EVENT_BUTTON, JS_EVENT_AXIS, JS_EVENT_INIT = 0x01, 0x02, 0x80
+
+
+def decode_js_events(device_id, data):
+    """
+    :param bytes data: whole js_event records
+    :return: list of InputEvent, the initial state reports left out
+    """
+    events = []
+    for _, value, kind, number in JS_EVENT.iter_unpack(data[:len(data) - len(data) % JS_EVENT.size]):
+        if kind & JS_EVENT_INIT:
+            continue
+        if kind == JS_EVENT_BUTTON:
+            events.append(input_event(device_id, 'button', number, value))
+        elif kind == JS_EVENT_AXIS:
+            events.append(input_event(device_id, 'axis', number, value))
+    return events
+
+
+class JoystickBackend(Backend):
+    name = 'joystick'
+
+    def available(self):
+        return os.path.isdir('/dev/input')
+
+    def scan(self):
+        devices = []
+        for path in sorted(glob.glob('/dev/input/js*')):
+            number = path[len('/dev/input/js'):]
+            try:
+                with open(f'/sys/class/input/js{number}/device/name') as f:
+                    name = f.read().strip()
+            except OSError:
+                name = f'Gamepad {number}'
+            devices.append({'id': f'gamepad_{number}', 'name': name, 'type': 'gamepad',
+                            'device_path': path, 'connected': True})
+        return devices
+
+    def start(self, device, emit):
+        def received(data):
+            for event in decode_js_events(device['id'], data):
+                emit(event)
+        return watch(device['device_path'], received, JS_EVENT.size * 64)
@@ -0,0 +1,93 @@
+"""
+MIDI inputs through PortMidi (pygame.midi), for systems without ALSA tools.
+
+The fallback of rtmidiin.py: PortMidi has neither a callback nor a file
+descriptor to wait on, so one reader thread polls every open input, drains
+all pending messages, and sleeps 1 ms when none had any. Inputs are opened
+and closed on that thread only.
+"""
+import os
+import threading
+import time
+
+from .backend import Backend
+from .events import midi_event
+
+# s the reader sleeps when no input had a message
+IDLE = 0.001
+
+
+class PortMidiBackend(Backend):
+    name = 'portmidi'
+    family = 'midi'
+
+    def __init__(self):
+        self._midi = None
+        self._inputs = {}
+        self._opening = []
+        self._closing = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def available(self):
+        try:
+            import pygame.midi  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _init(self):
+        if self._midi is None:
+            os.environ.setdefault('SDL_AUDIODRIVER', 'pulse')  # keeps ALSA quiet
+            import pygame.midi
+            pygame.midi.init()
+            self._midi = pygame.midi
+        return self._midi
+
+    def scan(self):
+        midi = self._init()
+        devices = []
+        for index in range(midi.get_count()):
+            _, name, is_input, _, opened = midi.get_device_info(index)
+            if is_input:
+                devices.append({'id': f'portmidi_{index}', 'name': name.decode(errors='replace'),
+                                'type': 'midi', 'index': index, 'connected': True})
+        return devices
+
+    def start(self, device, emit):
+        self._init()
+        with self._lock:
+            self._opening.append((device, emit))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._read, daemon=True)
+                self._thread.start()
+        return lambda: self._close(device['id'])
+
+    def _close(self, device_id):
+        with self._lock:
+            self._closing.append(device_id)
+
+    def _read(self):
+        inputs = self._inputs
+        while True:
+            with self._lock:
+                for device, emit in self._opening:
+                    inputs[device['id']] = (self._midi.Input(device['index']), emit)
+                for device_id in self._closing:
+                    if device_id in inputs:
+                        inputs.pop(device_id)[0].close()
+                self._opening.clear()
+                self._closing.clear()
+                if not inputs:
+                    self._thread = None
+                    return
+            busy = False
+            for device_id, (midi_input, emit) in inputs.items():
+                while midi_input.poll():
+                    busy = True
+                    for (status, data1, data2, _), _ in midi_input.read(64):
+                        event = midi_event(device_id, status, data1, data2)
+                        if event:
+                            emit(event)
+            if not busy:
+                time.sleep(IDLE)
@@ -0,0 +1,86 @@
+"""
+MIDI inputs through python-rtmidi (ALSA sequencer, CoreMIDI, WinMM).
+
+Nothing is polled: RtMidi's own thread blocks on the system MIDI API and
+calls back as each message arrives, the callback hands the event to the
+daemon's event loop, which broadcasts it to every client.
+
+Devices keep the ids of the ALSA backend, midi_<client> from the client
+number RtMidi puts at the end of ALSA port names ('MPK mini 3:MPK mini 3
+MIDI 1 28:0'), so presets and saved mappings work with either backend.
+"""
+import re
+import time
+
+from .backend import Backend
+from .events import midi_event
+from .alsa import SYSTEM_CLIENTS
+
+# client:port at the end of an ALSA port name
+ALSA_PORT = re.compile(r'\s(\d+):(\d+)$')
+
+
+def port_id(name, index, devices):
+    """
+    :param devices: devices already listed, a second port of a client gets midi_<client>_<port>
+    :return: midi_<client> as the ALSA backend, rtmidi_<index> when the name has no client number
+    """
+    match = ALSA_PORT.search(name)
+    if not match:
+        return f'rtmidi_{index}'
+    client, port = match.groups()
+    if any(device['id'] == f'midi_{client}' for device in devices):
+        return f'midi_{client}_{port}'
+    return f'midi_{client}'
+
+
+class RtMidiBackend(Backend):
+    name = 'rtmidi'
+    family = 'midi'
+
+    def available(self):
+        try:
+            import rtmidi  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def scan(self):
+        import rtmidi
+        midi_in = rtmidi.MidiIn()
+        try:
+            ports = midi_in.get_ports()
+        finally:
+            midi_in.delete()
+        devices = []
+        for index, name in enumerate(ports):
+            if name.startswith(SYSTEM_CLIENTS):
+                continue
+            devices.append({'id': port_id(name, index, devices), 'name': name, 'type': 'midi',
+                            'index': index, 'connected': True})
+        return devices
+
+    def start(self, device, emit):
+        import rtmidi
+        device_id = device['id']
+        midi_in = rtmidi.MidiIn()
+
+        def received(message, _):
+            data, _ = message
+            if len(data) == 3:
+                event = midi_event(device_id, data[0], data[1], data[2], time.time())
+                if event:
+                    emit(event)
+
+        try:
+            midi_in.open_port(device['index'])
+        except rtmidi.SystemError as e:
+            midi_in.delete()
+            raise OSError(e) from e
+        midi_in.set_callback(received)
+
+        def stop():
+            midi_in.cancel_callback()
+            midi_in.close_port()
+            midi_in.delete()
+        return stop
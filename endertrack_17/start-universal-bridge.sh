@@ -11,8 +11,6 @@ MISSING_DEPS=""
 # Vérifier websockets
 python3 -c "import websockets" 2>/dev/null || MISSING_DEPS="$MISSING_DEPS websockets"
 
-# Vérifier pygame (pour gamepad)
-python3 -c "import pygame" 2>/dev/null || MISSING_DEPS="$MISSING_DEPS pygame"
 
 if [ ! -z "$MISSING_DEPS" ]; then
     echo "❌ Dépendances manquantes: $MISSING_DEPS"
@@ -23,23 +21,19 @@ fi
 # Vérifier les outils système
 echo "🔧 Vérification des outils système..."
 
-if ! command -v jstest &> /dev/null; then
-    echo "⚠️  jstest non trouvé (pour gamepad)"
-    echo "💡 Installation: sudo apt install joystick"
-fi
-
 if ! command -v aseqdump &> /dev/null; then
     echo "⚠️  aseqdump non trouvé (pour MIDI)"
     echo "💡 Installation: sudo apt install alsa-utils"
+    echo "   (ou pip3 install pygame pour le backend PortMidi)"
 fi
 
 echo ""
-echo "🚀 Démarrage Universal Input Bridge..."
+echo "🚀 Démarrage du démon d'entrée..."
 echo "📡 WebSocket: ws://localhost:8765"
 echo "🎮 Support: MIDI, Gamepad, HID, Clavier"
 echo ""
 echo "Appuyez sur Ctrl+C pour arrêter"
 echo ""
 
-# Démarrer le bridge
-python3 "$(dirname "$0")/universal-input-bridge.py"
\ No newline at end of file
+# Démarrer le démon (options transmises: --backends, --listen, --port...)
+python3 "$(dirname "$0")/input-daemon.py" "$@"
\ No newline at end of file